@@ -0,0 +1,224 @@
+import hashlib
+import io
+import json
+import os
+import threading
+
+import paramiko
+
+
+class AgentError(Exception):
+    """The agent could not answer a request, e.g. because a file did not exist."""
+    pass
+
+
+class AgentUnavailable(Exception):
+    """The agent is not running, or exited before it answered."""
+    pass
+
+
+class AgentRequest:
+    def __init__(self, rid, method):
+        """
+        A request sent to the AgentClient, waiting for its response. For a streaming method,
+        the request is done when the stream ends.
+
+        :param rid: int, request ID, echoed back in the response
+        :param method: str, name of a function in remote_agent.METHODS
+        """
+        self.rid = rid
+        self.method = method
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def __repr__(self):
+        return f"<AgentRequest(rid={self.rid}, method={self.method})>"
+
+    def done(self):
+        return self._done.is_set()
+
+    def set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def set_error(self, error):
+        self._error = error
+        self._done.set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the response.
+        Raises AgentError or AgentUnavailable, or TimeoutError if no response arrived in time.
+        :return: the result of the method, as decoded JSON
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"No response from remote agent within {timeout} s: {self.method}")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class AgentClient:
+    def __init__(self, session, timeout=60, python="python3"):
+        """
+        Client for remote_agent.py. The agent is uploaded to the login node and started over
+        a single channel of the session's transport, and answers JSON requests with structured
+        data (queue snapshots, job metadata, file stats, directory scans and partial reads).
+        Requests are tagged with IDs, so many can be in flight at once.
+
+        :param session: session.Session
+        :param timeout: float, seconds to wait for a response
+        :param python: str, Python interpreter on the cluster
+        """
+        self.session = session
+        self.timeout = timeout
+        self.python = python
+
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "remote_agent.py"), "rb") as f:
+            self.source = f.read()
+        # Versioned by content, so an updated agent is uploaded next to the old one
+        self.remote_path = f".queuegui/agent_{hashlib.sha1(self.source).hexdigest()[:12]}.py"
+
+        self._lock = threading.Lock()
+        self._channel = None
+        self._reader = None
+        self._pending = {}
+        self._streams = {}  # request ID: callback for the events of a stream
+        self._next_rid = 0
+
+    def __repr__(self):
+        return f"<AgentClient({self.session}, alive={self.is_alive()})>"
+
+    def is_alive(self):
+        return self._channel is not None and not self._channel.closed and self._reader.is_alive()
+
+    def upload(self):
+        """
+        Upload the agent to the cluster, unless this version is already there.
+        """
+        sftp = self.session.sftp
+        try:
+            sftp.stat(self.remote_path)
+            return
+        except IOError:
+            pass
+
+        try:
+            sftp.mkdir(os.path.dirname(self.remote_path))
+        except IOError:
+            pass  # already exists
+        sftp.putfo(io.BytesIO(self.source), self.remote_path)
+
+    def start(self):
+        """
+        Upload and start the agent, and check that it answers.
+        :return: bool, False if the agent could not be started (e.g. no Python on the cluster)
+        """
+        try:
+            self.upload()
+            with self._lock:
+                self._channel = self.session.transport.open_session()
+                self._channel.exec_command(f"{self.python} -u {self.remote_path}")
+                self._reader = threading.Thread(target=self._read, args=(self._channel,), daemon=True)
+                self._reader.start()
+            self.call("ping")
+            return True
+        except (AgentError, AgentUnavailable, TimeoutError, IOError, paramiko.SSHException):
+            self.close()
+            return False
+
+    def _read(self, channel):
+        """
+        Read response lines and hand them to the waiting requests. Runs in its own thread.
+        """
+        buf = b""
+        while True:
+            chunk = channel.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                try:
+                    response = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+                if "event" in response:
+                    with self._lock:
+                        callback = self._streams.get(response.get("id"))
+                    if callback is not None:
+                        callback(response["event"])
+                    continue
+
+                with self._lock:
+                    request = self._pending.pop(response.get("id"), None)
+                    self._streams.pop(response.get("id"), None)
+                if request is None:
+                    continue
+                if "error" in response:
+                    request.set_error(AgentError(response["error"]))
+                else:
+                    request.set_result(response.get("result"))
+
+        with self._lock:
+            if self._channel is channel:
+                for request in self._pending.values():
+                    request.set_error(AgentUnavailable("Remote agent exited"))
+                self._pending.clear()
+                self._streams.clear()
+
+    def submit(self, method, _callback=None, **params):
+        """
+        Send a request without waiting for the response.
+        :param method: str, name of a function in remote_agent.METHODS
+        :param _callback: callable, called with each event of a streaming method, in the reader thread
+        :return: AgentRequest
+        """
+        with self._lock:
+            if not self.is_alive():
+                raise AgentUnavailable("Remote agent is not running")
+            self._next_rid += 1
+            request = AgentRequest(self._next_rid, method)
+            self._pending[request.rid] = request
+            if _callback is not None:
+                self._streams[request.rid] = _callback
+            line = json.dumps({"id": request.rid, "method": method, "params": params}) + "\n"
+            self._channel.sendall(line.encode("utf-8"))
+        return request
+
+    def call(self, method, **params):
+        """
+        Send a request and wait for the response.
+        Raises AgentError if the agent reported an error, and AgentUnavailable if it died.
+        :return: the result of the method, as decoded JSON
+        """
+        return self.submit(method, **params).result(self.timeout)
+
+    def subscribe(self, method, callback, **params):
+        """
+        Start a streaming method. The returned request is done when the stream ends,
+        e.g. because it was cancelled or the agent died.
+        :param method: str, name of a generator function in remote_agent.METHODS
+        :param callback: callable, called with each event, in the reader thread
+        :return: AgentRequest
+        """
+        return self.submit(method, _callback=callback, **params)
+
+    def unsubscribe(self, request):
+        """
+        Stop a stream started by subscribe.
+        :param request: AgentRequest
+        """
+        if not request.done():
+            self.submit("cancel", rid=request.rid)
+
+    def close(self):
+        with self._lock:
+            if self._channel is not None:
+                self._channel.close()
+            for request in self._pending.values():
+                request.set_error(AgentUnavailable("Remote agent was closed"))
+            self._pending.clear()
+            self._streams.clear()
+        self._channel = None
@@ -0,0 +1,127 @@
+from array import array
+
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+class CpuHistory:
+    def __init__(self, capacity=288):
+        """
+        Ring buffer of CPU usage samples: running and pending CPUs of each user and of the
+        whole cluster. Samples are stored in compact arrays of fixed size, so the memory use
+        does not grow over a long session. The oldest sample is overwritten when full, and users
+        are dropped once none of their samples are left.
+
+        :param capacity: int, number of samples kept
+        """
+        self.capacity = capacity
+        self.count = 0  # number of samples stored, at most capacity
+        self.head = 0  # index of the next sample to write
+
+        self.times = array("d", [0.0] * capacity)
+        self.running = array("l", [0] * capacity)
+        self.pending = array("l", [0] * capacity)
+        self.users = {}  # user: (running, pending) arrays, zero when the user had no jobs
+
+    def __repr__(self):
+        return f"<CpuHistory(samples={self.count}/{self.capacity}, users={len(self.users)})>"
+
+    def __len__(self):
+        return self.count
+
+    def add(self, timestamp, usage):
+        """
+        Store a sample.
+        :param timestamp: float, time.time() of the sample
+        :param usage: list of slurm.CpuUsage
+        :return:
+        """
+        i = self.head
+        sums = {}
+        for u in usage:
+            running, pending = sums.get(u.user, (0, 0))
+            sums[u.user] = (running + u.running, pending + u.pending)
+
+        self.times[i] = timestamp
+        self.running[i] = sum(running for running, _ in sums.values())
+        self.pending[i] = sum(pending for _, pending in sums.values())
+
+        for user in sums:
+            if user not in self.users:
+                self.users[user] = (array("l", [0] * self.capacity), array("l", [0] * self.capacity))
+        for user, (running, pending) in list(self.users.items()):
+            running[i], pending[i] = sums.get(user, (0, 0))
+            if not any(running) and not any(pending):
+                del self.users[user]
+
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _order(self):
+        """
+        :return: list of int, indices of the stored samples, oldest first
+        """
+        start = (self.head - self.count) % self.capacity
+        return [(start + k) % self.capacity for k in range(self.count)]
+
+    def series(self, user=None, since=None):
+        """
+        :param user: str, None for the cluster total
+        :param since: float, only samples taken at this time or later
+        :return: tuple of lists, (times, running, pending), oldest first
+        """
+        order = [i for i in self._order() if since is None or self.times[i] >= since]
+        times = [self.times[i] for i in order]
+        if user is None:
+            running, pending = self.running, self.pending
+        elif user in self.users:
+            running, pending = self.users[user]
+        else:
+            return times, [0] * len(order), [0] * len(order)
+        return times, [running[i] for i in order], [pending[i] for i in order]
+
+
+def sparkline(values, width=48, top=None):
+    """
+    Draw values as a line of block characters. If there are more values than width,
+    they are grouped into width buckets and the maximum of each bucket is drawn.
+
+    :param values: list of numbers
+    :param width: int, maximum number of characters
+    :param top: number, value drawn as a full block. Defaults to the maximum value
+    :return: str
+    """
+    if not values:
+        return ""
+    if len(values) > width:
+        size = len(values) / width
+        values = [max(values[int(k * size):int((k + 1) * size)]) for k in range(width)]
+
+    top = top or max(values) or 1
+    return "".join(SPARKS[min(len(SPARKS) - 1, int(v / top * (len(SPARKS) - 1) + 0.5))] for v in values)
+
+
+def format_trends(history, users, now, width=48):
+    """
+    Format the CPU usage trends of the cluster for the last hour and day, and of each user for the last day.
+
+    :param history: CpuHistory
+    :param users: list of str, users to show trends for
+    :param now: float, current time.time()
+    :param width: int, maximum length of the sparklines
+    :return: list of str, lines
+    """
+    lines = []
+    for label, since in [("last hour", now - 3600), ("last day", now - 86400)]:
+        _, running, pending = history.series(since=since)
+        if running:
+            lines.append(f"Running CPUs, {label}: {sparkline(running, width)} ({min(running)}-{max(running)})")
+            lines.append(f"Pending CPUs, {label}: {sparkline(pending, width)} ({min(pending)}-{max(pending)})")
+
+    # The users share the same scale, so that they can be compared
+    series = [(user, history.series(user, since=now - 86400)[1]) for user in users]
+    top = max([max(running, default=0) for _, running in series], default=0)
+    if top > 0:
+        lines.append("Running CPUs per user, last day:")
+        n = max(len(user) for user, _ in series)
+        lines += [f"{user.ljust(n)} {sparkline(running, width, top)}" for user, running in series]
+    return lines
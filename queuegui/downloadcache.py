@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import namedtuple
+
+# What was downloaded of a remote file, and where it was stored
+Download = namedtuple("Download", ["local_path", "size", "mtime"])
+
+
+class DownloadCache:
+    def __init__(self, overlap=4096, chunk_size=1 << 20):
+        """
+        Local copies of remote files. Output files of running jobs only grow, so when a file is
+        downloaded again, only the bytes appended since the last download are fetched. The last
+        few bytes of the previous download are fetched along with them, and if they differ, the
+        file was rewritten rather than appended to, and it is downloaded in full.
+
+        :param overlap: int, bytes of the previous download to compare with the remote file
+        :param chunk_size: int, bytes per read of the appended range
+        """
+        self.overlap = overlap
+        self.chunk_size = chunk_size
+        self.downloads = {}  # remote path to Download
+        self.transferred = 0  # bytes, for diagnostics
+        self._lock = threading.Lock()  # guards the dicts and counters, never held during a transfer
+        self._path_locks = {}  # remote path to the lock held while that file is transferred
+
+    def __repr__(self):
+        return f"<DownloadCache(files={len(self.downloads)}, transferred={self.transferred})>"
+
+    def fetch(self, sftp, path, local_path, read=None):
+        """
+        Make local_path an up to date copy of a remote file. Blocks on the transfer, so only call
+        this from a worker thread. Only fetches of the same file wait for each other.
+
+        :param sftp: paramiko.SFTPClient
+        :param path: str, remote path
+        :param local_path: str
+        :param read: callable, takes the remote path, an offset and a length, and returns the bytes
+                     there, e.g. through the remote agent. Used for the appended range instead of sftp
+        :return: str, local_path
+        """
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+
+        with path_lock:
+            st = sftp.stat(path)
+            with self._lock:
+                previous = self.downloads.get(path)
+
+            if previous is not None and previous.local_path == local_path and os.path.isfile(local_path) \
+                    and os.path.getsize(local_path) == previous.size:
+                if (st.st_size, st.st_mtime) == (previous.size, previous.mtime):
+                    return local_path
+                # A file that was written to without growing was rewritten
+                if st.st_size > previous.size and self._append(sftp, path, local_path, previous.size, st.st_size, read):
+                    self._store(path, Download(local_path, os.path.getsize(local_path), st.st_mtime))
+                    return local_path
+
+            # New, shrunk or rewritten file
+            sftp.get(path, local_path)
+            self._store(path, Download(local_path, os.path.getsize(local_path), st.st_mtime), st.st_size)
+            return local_path
+
+    def _store(self, path, download, transferred=0):
+        with self._lock:
+            self.downloads[path] = download
+            self.transferred += transferred
+
+    def _append(self, sftp, path, local_path, start, end, read=None):
+        """
+        Append bytes start to end of the remote file to the local copy, which has start bytes.
+        :return: bool, False if the overlap did not match, i.e. the file must be downloaded in full
+        """
+        overlap = min(self.overlap, start)
+        with open(local_path, "r+b") as local:
+            local.seek(start - overlap)
+            tail = local.read(overlap)
+
+            if read is None:
+                with sftp.open(path, "rb") as remote:
+                    remote.seek(start - overlap)
+                    return self._copy(remote.read, local, tail, start, end)
+
+            position = start - overlap
+
+            def read_next(length):
+                nonlocal position
+                data = read(path, position, length)
+                position += len(data)
+                return data
+
+            return self._copy(read_next, local, tail, start, end)
+
+    def _copy(self, read, local, tail, start, end):
+        """
+        Check that the remote file continues from tail, and copy the rest of it up to end.
+        :param read: callable, takes a length and returns the next bytes of the remote file, from start - len(tail)
+        :return: bool, False if the overlap did not match
+        """
+        if read(len(tail)) != tail:
+            return False
+
+        local.seek(start)
+        position = start
+        while position < end:
+            data = read(min(self.chunk_size, end - position))
+            if not data:
+                break
+            local.write(data)
+            position += len(data)
+        local.truncate()
+        with self._lock:
+            self.transferred += len(tail) + position - start
+        return True
+
+    def forget(self, path=None):
+        """
+        :param path: str, remote path whose local copy is not to be trusted anymore. None for all paths
+        """
+        with self._lock:
+            if path is None:
+                self.downloads.clear()
+            else:
+                self.downloads.pop(path, None)
@@ -0,0 +1,169 @@
+import queue
+import threading
+
+
+class Request:
+    def __init__(self, func, args, kwargs, callback=None, errback=None, tag=None):
+        """
+        A unit of remote work submitted to the RemoteExecutor.
+
+        :param func: callable, executed in a worker thread
+        :param args: tuple, positional arguments to func
+        :param kwargs: dict, keyword arguments to func
+        :param callback: callable, called in the Tk thread with the return value of func
+        :param errback: callable, called in the Tk thread with the exception raised by func
+        :param tag: str, used for cancelling groups of requests
+        """
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.callback = callback
+        self.errback = errback
+        self.tag = tag
+        self.cancelled = False
+
+    def __repr__(self):
+        return f"<Request(func={getattr(self.func, '__name__', self.func)}, tag={self.tag})>"
+
+    def cancel(self):
+        """
+        A cancelled request is skipped if it has not started yet, and its result is
+        discarded if it is already running.
+        """
+        self.cancelled = True
+
+
+class RemoteExecutor:
+    def __init__(self, widget, workers=2, interval=50, on_error=None):
+        """
+        Run remote commands and file transfers off the Tk thread. Results are collected
+        from the worker threads and handed back to Tk in batches by a dispatcher that
+        runs on the Tk event loop via after().
+
+        :param widget: Tk widget whose after() is used for dispatching results
+        :param workers: int, number of worker threads
+        :param interval: int, dispatcher interval in ms
+        :param on_error: callable, default errback for requests that do not define one
+        """
+        self.widget = widget
+        self.interval = interval
+        self.on_error = on_error
+
+        self._pending = queue.Queue()
+        self._finished = queue.Queue()
+        self._running = True
+
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+        self._after_id = self.widget.after(self.interval, self._dispatch)
+
+    def submit(self, func, *args, callback=None, errback=None, tag=None, **kwargs):
+        """
+        Queue func(*args, **kwargs) for execution in a worker thread.
+        :return: Request, can be used to cancel the request
+        """
+        request = Request(func, args, kwargs, callback=callback, errback=errback, tag=tag)
+        if self._running:
+            self._pending.put(request)
+        return request
+
+    def post(self, func, *args):
+        """
+        Schedule func(*args) to run in the Tk thread with the next batch of results.
+        Safe to call from any thread.
+        """
+        self._finished.put((None, func, args))
+
+    def cancel(self, tag=None):
+        """
+        Cancel all pending and running requests with the given tag. If tag is None,
+        every request is cancelled.
+        :return: int, number of cancelled requests
+        """
+        cancelled = 0
+        with self._finished.mutex:
+            requests = [item[0] for item in self._finished.queue if item[0] is not None]
+        requests += self._unfinished()
+
+        for request in requests:
+            if (tag is None or request.tag == tag) and not request.cancelled:
+                request.cancel()
+                cancelled += 1
+        return cancelled
+
+    def pending(self, tag=None):
+        """
+        Count the requests with the given tag that are queued or running, e.g. to avoid
+        piling up periodic requests when the cluster is slow. If tag is None, all are counted.
+        :return: int
+        """
+        return len([request for request in self._unfinished()
+                    if (tag is None or request.tag == tag) and not request.cancelled])
+
+    def _unfinished(self):
+        """
+        :return: list, queued and running requests
+        """
+        with self._pending.mutex:
+            requests = [request for request in self._pending.queue if request is not None]
+        requests += [worker.request for worker in self._workers if getattr(worker, "request", None) is not None]
+        return requests
+
+    def shutdown(self):
+        """
+        Cancel everything, stop the dispatcher and let the worker threads exit.
+        """
+        self._running = False
+        self.cancel()
+        for _ in self._workers:
+            self._pending.put(None)
+        try:
+            self.widget.after_cancel(self._after_id)
+        except Exception:
+            pass  # widget already destroyed
+
+    def _work(self):
+        worker = threading.current_thread()
+        while True:
+            request = self._pending.get()
+            if request is None:
+                return
+            if request.cancelled:
+                continue
+
+            worker.request = request
+            try:
+                result = request.func(*request.args, **request.kwargs)
+                handler, args = request.callback, (result,)
+            except Exception as e:
+                handler, args = request.errback or self.on_error, (e,)
+            finally:
+                worker.request = None
+
+            if handler is not None and not request.cancelled:
+                self._finished.put((request, handler, args))
+
+    def _dispatch(self):
+        """
+        Deliver all results that are ready, then re-arm. Runs in the Tk thread.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._finished.get_nowait())
+            except queue.Empty:
+                break
+
+        for request, handler, args in batch:
+            if request is not None and request.cancelled:
+                continue
+            try:
+                handler(*args)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+
+        if self._running:
+            self._after_id = self.widget.after(self.interval, self._dispatch)
@@ -1,4 +1,12 @@
 import os
+import re
+import shlex
+import uuid
+import difflib
+from collections import namedtuple
+
+
+BatchResult = namedtuple("BatchResult", ["stdout", "stderr", "exit_code"])
 
 
 def modulo_generator(length=3000, mod=3):
@@ -69,19 +77,129 @@ def purify_path(path):
     return os.path.join("/"+first, *rest)
 
 
+def diff_rows(old, new):
+    """
+    Compute the edits that turn one list of rows into another. Rows are matched by key,
+    so a row that only changed content is replaced in place, and unchanged rows are not touched.
+
+    :param old: list of (key, row) tuples, as currently shown
+    :param new: list of (key, row) tuples, to be shown
+    :return: list of edits, ("delete", start, end) or ("insert", start, rows), where start and end
+             are indices into old. The edits are ordered from the bottom up, so they can be applied
+             one by one without adjusting the indices.
+    """
+    matcher = difflib.SequenceMatcher(None, [key for key, _ in old], [key for key, _ in new], autojunk=False)
+    edits = []
+    for op, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if op == "equal":
+            for k in reversed(range(i2 - i1)):
+                if old[i1 + k][1] != new[j1 + k][1]:
+                    edits.append(("delete", i1 + k, i1 + k + 1))
+                    edits.append(("insert", i1 + k, [new[j1 + k][1]]))
+            continue
+        if i2 > i1:
+            edits.append(("delete", i1, i2))
+        if j2 > j1:
+            edits.append(("insert", i1, [row for _, row in new[j1:j2]]))
+    return edits
+
+
+def batch_script(commands, sentinel):
+    """
+    Build a shell script that runs each command in a subshell, and marks the end of each
+    command's output with a sentinel line on both stdout and stderr. The sentinel line on
+    stdout also carries the exit code of the command.
+
+    :param commands: list of shell commands
+    :param sentinel: str, unique marker that does not occur in the output
+    :return: str
+    """
+    script = []
+    for i, cmd in enumerate(commands):
+        script.append(f"( {cmd}\n) < /dev/null")
+        script.append(f"printf '\\n{sentinel} {i} %d\\n' $?")
+        script.append(f"printf '\\n{sentinel} {i}\\n' >&2")
+    return "\n".join(script) + "\n"
+
+
+def split_batch_output(stdout, stderr, sentinel, n):
+    """
+    Split the output of a script made by batch_script into the output of each command.
+    Commands that never finished (e.g. because the connection dropped) get exit code None.
+
+    :param stdout: str
+    :param stderr: str
+    :param sentinel: str, the marker passed to batch_script
+    :param n: int, number of commands
+    :return: list of BatchResult
+    """
+    def split(text, with_code):
+        pattern = re.compile(rf"\n{re.escape(sentinel)} (\d+)" + (r" (-?\d+)" if with_code else "") + r"\n")
+        segments, codes, start = {}, {}, 0
+        for match in pattern.finditer(text):
+            i = int(match.group(1))
+            segments[i] = text[start:match.start()]
+            if with_code:
+                codes[i] = int(match.group(2))
+            start = match.end()
+        return segments, codes
+
+    out, codes = split(stdout, with_code=True)
+    err, _ = split(stderr, with_code=False)
+    return [BatchResult(out.get(i, ""), err.get(i, ""), codes.get(i)) for i in range(n)]
+
+
+def run_batch(ssh_client, commands):
+    """
+    Run many shell commands in a single channel, i.e. at the cost of a single round trip.
+    The commands are run in order, each in its own subshell, regardless of whether
+    the previous ones failed.
+
+    :param ssh_client: object with an exec_command method (e.g. session.Session)
+    :param commands: list of shell commands
+    :return: list of BatchResult(stdout, stderr, exit_code), one per command
+    """
+    if not commands:
+        return []
+
+    sentinel = f"__QUEUEGUI_{uuid.uuid4().hex}__"
+    stdin, stdout, stderr = ssh_client.exec_command("/bin/sh -s")
+    stdin.write(batch_script(commands, sentinel))
+    stdin.channel.shutdown_write()
+
+    out = stdout.read().decode("utf-8", errors="replace")
+    err = stderr.read().decode("utf-8", errors="replace")
+    return split_batch_output(out, err, sentinel, len(commands))
+
+
+def stat_command(paths):
+    """
+    :param paths: list of str
+    :return: str, command that stats all paths at once, whose output can be parsed by parse_stat.
+             Missing paths are left out of the output
+    """
+    return f"stat -c '%s|%Y|%F|%n' {' '.join(shlex.quote(path) for path in paths)} 2>/dev/null"
+
+
+def parse_stat(output, paths):
+    """
+    :param output: str, output of stat_command
+    :param paths: list of str, the paths given to stat_command
+    :return: list of dict, one per path and in the same order, like the stat method of the remote agent
+    """
+    found = {}
+    for line in output.splitlines():
+        values = line.split("|", 3)
+        if len(values) == 4 and values[0].isdigit() and values[1].isdigit():
+            size, mtime, filetype, path = values
+            found[path] = {"path": path, "exists": True, "size": int(size), "mtime": float(mtime),
+                           "is_dir": filetype == "directory"}
+    return [found.get(path, {"path": path, "exists": False}) for path in paths]
+
+
 def is_remotefile(ssh_client, f):
-    cmd = f"test -f {f} && echo 1 || echo 0"
-    stdin, stdout, stderr = ssh_client.exec_command(cmd)
-    if stdout.read().decode("ascii").strip() == "1":
-        return True
-    else:
-        return False
+    return run_batch(ssh_client, [f"test -f {f}"])[0].exit_code == 0
 
 
 def is_remotedir(ssh_client, d):
-    cmd = f"test -d {d} && echo 1 || echo 0"
-    stdin, stdout, stderr = ssh_client.exec_command(cmd)
-    if stdout.read().decode("ascii").strip() == "1":
-        return True
-    else:
-        return False
+    return run_batch(ssh_client, [f"test -d {d}"])[0].exit_code == 0
@@ -1,19 +1,35 @@
+from jobrecord import JobRecord
+
+
 class Job:
-    def __init__(self, ssh_client=None, pid=None):
+    def __init__(self, ssh_client=None, pid=None, records=None):
         """
         Class that describes a job instance in the queue, fully defined by its process ID.
 
         :param root: an instance of MainWindow in order to access some methods
         :param pid: the process ID of the job
+        :param records: jobrecord.JobRecordCache, shared cache of scontrol output. If not given,
+                        scontrol is run once for this instance
         """
         self.pid = pid
         self.ssh_client = ssh_client  # the MainWindow instance
+        self.records = records
         self.cmd = f"scontrol show jobid {self.pid}"
+        self._record = None
 
     def jobinfo(self):
-        stdin, stdout, stderr = self.ssh_client.exec_command(self.cmd)
-        return stdout.read().decode("ascii")
+        return self.record().text
+
+    def record(self):
+        """
+        :return: jobrecord.JobRecord
+        """
+        if self.records is not None:
+            return self.records.get(self.pid)
+        if self._record is None:
+            stdin, stdout, stderr = self.ssh_client.exec_command(self.cmd)
+            self._record = JobRecord(self.pid, stdout.read().decode("ascii"))
+        return self._record
 
-    def get_info(self, target, delim=" "):
-        field = [line for line in self.jobinfo().splitlines() if target+"=" in line][0]
-        return [el for el in field.split(delim) if target+"=" in el][0].split("=")[1]
+    def get_info(self, target):
+        return self.record().fields[target]
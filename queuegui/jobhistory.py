@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+import time
+
+import slurm
+from sacct import SacctJob, sacct_command, parse_sacct
+
+
+# Columns of the jobs table, typed like SacctJob. Names are quoted, as "end" is an SQL keyword.
+COLUMNS = [(f'"{field}"', "TEXT" if field in ("jobid", "user", "partition", "state", "name") else "INTEGER")
+           for field in SacctJob._fields]
+SCHEMA_VERSION = 2  # Stores with another version are only a cache, so they are rebuilt
+
+# Jobs still running at the last sync may have finished just before it, so syncs overlap a little
+SYNC_OVERLAP = 300
+
+
+def date_to_time(date):
+    """
+    :param date: str, date as YYYY-MM-DD
+    :return: float, seconds since the epoch at local midnight
+    """
+    return time.mktime(time.strptime(date, "%Y-%m-%d"))
+
+
+class JobHistoryStore:
+    def __init__(self, path):
+        """
+        Local copy of the job history of one user on one cluster, kept in SQLite. It is synced
+        incrementally from sacct, and the history views query it locally.
+
+        :param path: str, path to the database file, created if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self.db.execute("DROP TABLE IF EXISTS jobs")
+                self.db.execute("DROP TABLE IF EXISTS meta")
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS jobs ({', '.join(f'{c} {t}' for c, t in COLUMNS)}, "
+                            f"final INTEGER, PRIMARY KEY (jobid))")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+
+    def __repr__(self):
+        return f"<JobHistoryStore({self.path})>"
+
+    def _get_meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def last_sync(self):
+        """
+        :return: float, time.time() of the last sync. None if never synced
+        """
+        with self._lock:
+            return self._get_meta("last_sync")
+
+    def is_synced(self, starttime, max_age):
+        """
+        :param starttime: str, date as YYYY-MM-DD
+        :param max_age: float, seconds
+        :return: bool, whether the store goes back to starttime, and was synced less than max_age ago
+        """
+        start = date_to_time(starttime)
+        with self._lock:
+            synced_from, last_sync = self._get_meta("synced_from"), self._get_meta("last_sync")
+        return synced_from is not None and synced_from <= start and time.time() - last_sync < max_age
+
+    def sync(self, run, user, starttime):
+        """
+        Fetch the jobs that changed since the last sync, or all jobs since starttime if the
+        store does not go that far back yet. May block on remote calls, so only call this
+        from a worker thread.
+
+        :param run: callable, runs a command on the cluster and returns its stdout
+        :param user: str
+        :param starttime: str, date as YYYY-MM-DD
+        :return: int, number of jobs stored or updated
+        """
+        start = date_to_time(starttime)
+        now = time.time()
+        with self._lock:
+            synced_from, last_sync = self._get_meta("synced_from"), self._get_meta("last_sync")
+        if synced_from is None or start < synced_from:
+            since = start
+        else:
+            since = last_sync - SYNC_OVERLAP
+
+        jobs = parse_sacct(run(sacct_command(user, int(since))))
+
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c, _ in COLUMNS)
+        with self._lock, self.db:
+            # Jobs in a final state are never updated once stored
+            self.db.executemany(
+                f"INSERT INTO jobs VALUES ({placeholders}, ?) ON CONFLICT (jobid) DO UPDATE SET {updates}, "
+                f"final = excluded.final WHERE jobs.final = 0",
+                [tuple(job) + (int(job.state in slurm.FINAL_STATES),) for job in jobs])
+            self._set_meta("synced_from", min(since, synced_from if synced_from is not None else since))
+            self._set_meta("last_sync", now)
+        return len(jobs)
+
+    def query(self, status=None, starttime=None, keywords=()):
+        """
+        Select jobs from the local history. Cheap enough to run in the Tk thread.
+
+        :param status: str, key of slurm.STATE_CODES. None or "all" for all states
+        :param starttime: str, date as YYYY-MM-DD. Only jobs that ended at this time or later
+        :param keywords: list of str, only jobs where any of them occurs in the name, ID, user, partition or state
+        :return: list of SacctJob, by start time
+        """
+        conditions, params = [], []
+        if status is not None and status != "all":
+            conditions.append("state = ?")
+            params.append(slurm.STATE_CODES.get(status.lower(), status.upper()))
+        if starttime is not None:
+            conditions.append('("end" >= ? OR "end" IS NULL)')  # jobs that have not ended yet have no end time
+            params.append(date_to_time(starttime))
+        if keywords:
+            text = "name || ' ' || jobid || ' ' || user || ' ' || partition || ' ' || state"
+            conditions.append("(" + " OR ".join(f"instr({text}, ?) > 0" for _ in keywords) + ")")
+            params += list(keywords)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        columns = ", ".join(c for c, _ in COLUMNS)
+        with self._lock:
+            rows = self.db.execute(f"SELECT {columns} FROM jobs {where} ORDER BY start IS NULL, start, jobid", params)
+            return [SacctJob(*row) for row in rows.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
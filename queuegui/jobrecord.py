@@ -0,0 +1,337 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import slurm
+
+# A field of scontrol show job is Key=Value, where the value runs until the next key
+FIELD_PATTERN = re.compile(r"(\w[\w:/]*)=(.*?)(?=\s+\w[\w:/]*=|\s*$)", re.S)
+
+# Fields of finished jobs fetched from sacct when scontrol has forgotten them, with their scontrol names.
+# JobName may contain the delimiter, so it comes last
+SACCT_RECORD_FIELDS = [("JobID", "JobId"), ("JobIDRaw", "JobIdRaw"), ("State", "JobState"), ("WorkDir", "WorkDir"),
+                       ("StdOut", "StdOut"), ("User", "UserId"), ("ArrayJobID", "ArrayJobId"),
+                       ("ArrayTaskID", "ArrayTaskId"), ("JobName", "JobName")]
+NO_ARRAY_TASK = "4294967294"  # what Slurm expands %a to for jobs that are not array tasks
+SACCT_BATCH_SIZE = 200  # job IDs per sacct call, to keep the command line short
+PREFETCH_BATCH_SIZE = 100  # scontrol calls per round trip
+
+
+def parse_scontrol(output):
+    """
+    :param output: str, output of scontrol show jobid, on one line (-o) or many
+    :return: dict, field name to value. Values may contain spaces
+    """
+    return dict(FIELD_PATTERN.findall(output.strip()))
+
+
+def record_jobid(fields):
+    """
+    :param fields: dict, as returned by parse_scontrol
+    :return: str, the job ID as squeue shows it, i.e. ArrayJobId_ArrayTaskId for array tasks
+    """
+    array_jobid, task = fields.get("ArrayJobId"), fields.get("ArrayTaskId")
+    if not array_jobid or not task:
+        return fields.get("JobId")
+    return f"{array_jobid}_{task}" if task.isdigit() else f"{array_jobid}_[{task}]"
+
+
+def format_scontrol(fields):
+    """
+    :param fields: dict, as returned by parse_scontrol
+    :return: str, one field per line, for showing a job parsed from one line output
+    """
+    return "\n".join(f"   {key}={value}" for key, value in fields.items()).lstrip() + "\n"
+
+
+def sacct_records_command(jobids):
+    """
+    :param jobids: list of str
+    :return: str, sacct command whose output can be parsed by parse_sacct_records
+    """
+    return (f"sacct -X --parsable2 --noheader -j {','.join(jobids)} "
+            f"--format={','.join(field for field, _ in SACCT_RECORD_FIELDS)}")
+
+
+def parse_sacct_records(output):
+    """
+    Parse the output of sacct_records_command into the fields scontrol would have shown.
+    Filename patterns in StdOut, such as %j for the job ID, %u for the user and %A_%a for array
+    tasks, are expanded. %j is the raw job ID, which differs from JobId for array tasks.
+
+    :param output: str
+    :return: list of dict
+    """
+    records = []
+    for line in output.splitlines():
+        values = line.split("|", len(SACCT_RECORD_FIELDS) - 1)
+        if len(values) != len(SACCT_RECORD_FIELDS):
+            continue
+        # Jobs that are not array tasks have no array fields, as in scontrol
+        fields = {name: value for (_, name), value in zip(SACCT_RECORD_FIELDS, values)
+                  if value or name not in ("ArrayJobId", "ArrayTaskId")}
+        jobid_raw = fields["JobIdRaw"] or fields["JobId"]
+        patterns = {"j": jobid_raw, "u": fields["UserId"], "A": fields.get("ArrayJobId", jobid_raw),
+                    "a": fields.get("ArrayTaskId", NO_ARRAY_TASK), "x": fields["JobName"], "%": "%"}
+        fields["StdOut"] = re.sub(r"%(.)", lambda m: patterns.get(m.group(1), m.group(0)), fields["StdOut"])
+        records.append(fields)
+    return records
+
+
+class JobRecord:
+    def __init__(self, jobid, text, timestamp=None):
+        """
+        A job as described by scontrol show jobid, parsed once into its fields.
+
+        :param jobid: str
+        :param text: str, output of scontrol show jobid
+        :param timestamp: float, time.time() of the fetch
+        """
+        self.jobid = jobid
+        self.text = text
+        self.fields = parse_scontrol(text)
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __repr__(self):
+        return f"<JobRecord({self.jobid}, {self.state})>"
+
+    def get(self, field, default=None):
+        return self.fields.get(field, default)
+
+    @property
+    def state(self):
+        """
+        :return: str, e.g. RUNNING. None if scontrol did not know the job
+        """
+        state = self.fields.get("JobState")
+        return state.split()[0] if state else None
+
+    @property
+    def is_finished(self):
+        return self.state in slurm.FINAL_STATES
+
+    @property
+    def jobname(self):
+        """
+        :return: str, stem of the output file, which is what the input and output files are named after.
+                 None if not known
+        """
+        stdout = self.fields.get("StdOut", "")
+        if not stdout.startswith("/"):
+            return None
+        return os.path.splitext(os.path.basename(stdout))[0]
+
+    @property
+    def workdir(self):
+        return self.fields.get("WorkDir")
+
+
+class JobRecordStore:
+    def __init__(self, path):
+        """
+        Records of finished jobs of one cluster, kept in SQLite. Finished jobs never change, so
+        their records are kept for good, also after scontrol and sacct would need to be asked again.
+
+        :param path: str, path to the database file, created if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS records (jobid TEXT PRIMARY KEY, text TEXT, timestamp REAL)")
+
+    def __repr__(self):
+        return f"<JobRecordStore({self.path})>"
+
+    def load(self, jobids):
+        """
+        :param jobids: list of str
+        :return: dict, job ID to JobRecord, for the jobs that are stored
+        """
+        records = {}
+        with self._lock:
+            for i in range(0, len(jobids), 500):
+                chunk = jobids[i:i + 500]
+                rows = self.db.execute(f"SELECT jobid, text, timestamp FROM records "
+                                       f"WHERE jobid IN ({', '.join('?' for _ in chunk)})", chunk)
+                records.update((jobid, JobRecord(jobid, text, timestamp)) for jobid, text, timestamp in rows)
+        return records
+
+    def save(self, records):
+        """
+        :param records: list of JobRecord. Only the records of finished jobs are stored
+        """
+        with self._lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?)",
+                                [(record.jobid, record.text, record.timestamp) for record in records
+                                 if record.is_finished])
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+class JobRecordCache:
+    def __init__(self, fetch, ttl=30.0, run=None, store=None):
+        """
+        JobRecords by job ID, so the job name, work directory and the other fields of a job cost
+        a single scontrol call. Records of finished jobs never expire, as the jobs do not change
+        anymore. Other records expire after ttl, or when the queue shows that their job changed.
+
+        scontrol forgets jobs shortly after they finish. Records of such jobs are then taken
+        from sacct, and records of finished jobs are kept in a persistent store if one is given.
+
+        :param fetch: callable, takes a job ID and returns the output of scontrol show jobid
+        :param ttl: float, seconds records of unfinished jobs are valid
+        :param run: callable, runs a command on the cluster and returns its stdout. Used for sacct,
+                    which is not asked if not given
+        :param store: JobRecordStore
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.run = run
+        self.store = store
+        self.records = {}
+        self.fetches = 0
+        self.unknown = set()  # jobs that a prefetch did not find, so they are not prefetched again
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<JobRecordCache(records={len(self.records)})>"
+
+    def __len__(self):
+        return len(self.records)
+
+    def is_valid(self, record):
+        return record.is_finished or time.time() - record.timestamp < self.ttl
+
+    def get(self, jobid):
+        """
+        Get the record of a job, fetching it if it is not cached or has expired. May block on
+        remote calls, so call it from a worker thread where possible.
+
+        :param jobid: str
+        :return: JobRecord
+        """
+        jobid = str(jobid).strip()
+        with self._lock:
+            record = self.records.get(jobid)
+        if record is not None and self.is_valid(record):
+            return record
+
+        if self.store is not None:
+            record = self.store.load([jobid]).get(jobid)
+            if record is not None:
+                with self._lock:
+                    self.records[jobid] = record
+                return record
+
+        record = JobRecord(jobid, self.fetch(jobid))
+        with self._lock:
+            self.records[jobid] = record
+            self.fetches += 1
+        if record.state is None and self.run is not None:
+            self.fetch_finished([jobid])
+            with self._lock:
+                record = self.records[jobid]
+        elif record.is_finished and self.store is not None:
+            self.store.save([record])
+        return record
+
+    def fetch_finished(self, jobids):
+        """
+        Fetch the records of finished jobs from the persistent store, or else from sacct, with
+        a single sacct call per SACCT_BATCH_SIZE jobs. May block on remote calls, so only call
+        this from a worker thread.
+
+        :param jobids: list of str
+        :return: int, number of records found
+        """
+        found = self.store.load(jobids) if self.store is not None else {}
+        remaining = [jobid for jobid in jobids if jobid not in found]
+
+        fetched = []
+        calls = 0
+        if self.run is not None:
+            timestamp = time.time()
+            for i in range(0, len(remaining), SACCT_BATCH_SIZE):
+                output = self.run(sacct_records_command(remaining[i:i + SACCT_BATCH_SIZE]))
+                fetched += [JobRecord(fields["JobId"], format_scontrol(fields), timestamp)
+                            for fields in parse_sacct_records(output)]
+                calls += 1
+            if self.store is not None:
+                self.store.save(fetched)
+        found.update((record.jobid, record) for record in fetched)
+
+        with self._lock:
+            self.fetches += calls
+            self.records.update(found)
+            self.unknown |= set(jobids) - set(found)
+        return len(found)
+
+    def missing(self, jobids):
+        """
+        :param jobids: iterable of str
+        :return: list of str, the jobs that have no valid record, and are worth prefetching. Records that
+                 expired are prefetched again, so selecting their jobs needs no scontrol call of its own
+        """
+        with self._lock:
+            return [jobid for jobid in jobids if jobid not in self.unknown
+                    and (jobid not in self.records or not self.is_valid(self.records[jobid]))]
+
+    def prefetch(self, run_batch, jobids):
+        """
+        Fetch the records of many jobs with one scontrol -o show job per job, run in batches of
+        PREFETCH_BATCH_SIZE commands per round trip. May block on remote calls, so only call this
+        from a worker thread.
+
+        :param run_batch: callable, runs a list of commands on the cluster and returns their stdouts
+        :param jobids: list of str, jobs to fetch records of, as squeue shows them
+        :return: int, number of records stored
+        """
+        wanted = set(jobids)
+        timestamp = time.time()
+        records = []
+        calls = 0
+        for i in range(0, len(jobids), PREFETCH_BATCH_SIZE):
+            outputs = run_batch([f"scontrol -o show job {jobid}" for jobid in jobids[i:i + PREFETCH_BATCH_SIZE]])
+            calls += 1
+            for line in "\n".join(outputs).splitlines():
+                fields = parse_scontrol(line)
+                jobid = record_jobid(fields)
+                if jobid in wanted:
+                    records.append(JobRecord(jobid, format_scontrol(fields), timestamp))
+
+        with self._lock:
+            for record in records:
+                self.records[record.jobid] = record
+            self.unknown |= wanted - {record.jobid for record in records}
+            self.fetches += calls
+        return len(records)
+
+    def invalidate(self, jobid=None):
+        """
+        :param jobid: str, job to drop. None to drop all records
+        """
+        with self._lock:
+            if jobid is None:
+                self.records.clear()
+                self.unknown.clear()
+            else:
+                self.records.pop(str(jobid).strip(), None)
+                self.unknown.discard(str(jobid).strip())
+
+    def sync(self, states):
+        """
+        Drop the records of unfinished jobs that changed state or left the queue, and forget
+        the jobs unknown to a prefetch that left the queue.
+
+        :param states: dict, job ID to state, as in the queue
+        """
+        with self._lock:
+            for jobid, record in list(self.records.items()):
+                if not record.is_finished and states.get(jobid) != record.state:
+                    del self.records[jobid]
+            self.unknown &= states.keys()
@@ -23,9 +23,8 @@ class Login(tk.Frame):
         self.pady = 5
         self.padx = 5
 
-        # Set the ssh client
-        self.ssh_client = pmk.SSHClient()
-        self.ssh_client.set_missing_host_key_policy(pmk.AutoAddPolicy())
+        # The authenticated session, handed over to MainWindow after a successful login
+        self.session = None
 
         # Define and place widgets
         for i, cluster in enumerate(self.parent.photos.keys()):
@@ -44,19 +43,28 @@ class Login(tk.Frame):
         if self.parent.firstlogin.get():
             user = tk.simpledialog.askstring("", "Username: ")
             pwd = tk.simpledialog.askstring("", "Password: ", show="*")
-            self.send_credentials(hostname, user, pwd)
+            if not self.send_credentials(hostname, user, pwd):
+                return
 
             self.parent.user.set(user)
             self.parent.pwd.set(pwd)
 
             self.parent.show_main()
         else:
-            self.send_credentials(hostname, self.parent.user.get(), self.parent.pwd.get())
+            if not self.send_credentials(hostname, self.parent.user.get(), self.parent.pwd.get()):
+                return
             self.parent.show_main()
 
     def send_credentials(self, hostname, user, pwd):
+        """
+        Get an authenticated session to the cluster from the session pool. On success the
+        session is stored in self.session, where MainWindow picks it up.
+        :return: bool, whether the login succeeded
+        """
         try:
-            self.ssh_client.connect(hostname=hostname, username=user, password=pwd)
+            self.session = self.parent.session_pool.get(hostname, user, pwd)
             self.parent.firstlogin.set(False)
+            return True
         except pmk.ssh_exception.AuthenticationException:
-            tk.messagebox.showerror("Error", f"Login to {hostname.split('.')[0]} failed:\nIncorrect username or password.")
\ No newline at end of file
+            tk.messagebox.showerror("Error", f"Login to {hostname.split('.')[0]} failed:\nIncorrect username or password.")
+            return False
\ No newline at end of file
@@ -2,11 +2,13 @@ import tkinter as tk
 from tkinter import simpledialog, messagebox
 from collections import OrderedDict
 from datetime import datetime, timedelta
+import base64
 import os
 import re
 import requests
-import paramiko as pmk
+import threading
 import subprocess
+import time
 import matplotlib
 matplotlib.use("tkagg")
 import matplotlib.pyplot as plt
@@ -15,6 +17,18 @@ from preferences import Preferences
 from toolbox import ToolBox
 from convertme import ConvertMe
 from job import Job
+from executor import RemoteExecutor
+from agent import AgentError, AgentUnavailable
+from snapshot import QueueSnapshot
+from cpuhistory import CpuHistory, format_trends
+from jobhistory import JobHistoryStore
+from jobrecord import JobRecordCache, JobRecordStore, format_scontrol
+from scratchindex import ScratchIndex
+from downloadcache import DownloadCache
+from sacct import format_history
+from scheduler import PollScheduler, TimerRegistry
+from virtualview import VirtualView
+import slurm
 import helpers
 
 from output_parsers.gaussian import GaussianOut
@@ -41,27 +55,63 @@ class MainWindow(tk.Frame):
         self.output_last_update = tk.StringVar()
         self.url_readme = "https://raw.githubusercontent.com/Andersmb/QueueGui/master/README.md"
 
-        # We have to once again establish the connection to the remote cluster
-        # (apparently the established connection from Login does not hold)
-        hostname = self.parent.cluster_data[self.parent.host.get()]["hostname"]
-        self.ssh_client = pmk.SSHClient()
-
-        self.ssh_client.set_missing_host_key_policy(pmk.AutoAddPolicy())
-        self.ssh_client.connect(hostname=hostname,
-                                username=self.parent.user.get(),
-                                password=self.parent.pwd.get())
-        transport = pmk.Transport((hostname, 22))
-        transport.connect(None, self.parent.user.get(), self.parent.pwd.get())
-        self.sftp_client = pmk.SFTPClient.from_transport(transport)
+        # Take over the authenticated session from Login. Shell commands and SFTP
+        # share its single transport, so no additional handshakes are needed.
+        self.session = self.parent.login_window.session
+        self.ssh_client = self.session
+        self.sftp_client = self.session.sftp
+        self.session.use_persistent_shell(self.parent.persistent_shell.get())
+
+        # Remote commands and transfers run in worker threads, so that the GUI never blocks on SSH
+        self.executor = RemoteExecutor(self, on_error=lambda e: self.log_update(f"Remote request failed: {e}"))
+
+        # Periodic tasks are registered here, and cancelled when the window is destroyed
+        self.timers = TimerRegistry(self)
+
+        # The queue of the logged in user is polled once per monitoring interval, and the views of
+        # that user read from the last snapshot. Other users and the whole cluster are queried on demand.
+        self.snapshot = QueueSnapshot(self.fetch_queue, ttl=self.parent.queue_monitor_update_frequency.get() / 1000,
+                                      user=self.parent.user.get())
+        self.poller = PollScheduler(self.parent.queue_monitor_update_frequency.get(),
+                                    minimum=self.parent.queue_monitor_min_update_frequency.get())
+        # CPU usage is sampled every five minutes when enabled, and the last day of samples is kept.
+        # The history belongs to the cluster, so it survives logging out and switching clusters.
+        self.cpu_history = self.parent.cpu_histories.setdefault(self.parent.host.get(), CpuHistory(capacity=288))
+        self.cpu_sample_interval = 300000
+        # The job history of each user is kept in a local database, which is synced at most once a minute
+        self.history_stores = {}
+        self.history_sync_interval = 60
+        # scontrol show jobid is parsed once per job, and kept until the job changes in the queue.
+        # Jobs scontrol has forgotten are taken from sacct, and finished jobs are kept for good.
+        records_path = self.local_path(f"jobrecords_{self.parent.host.get()}.sqlite")
+        self.job_records = JobRecordCache(self.fetch_jobinfo, ttl=30, run=lambda cmd: self.session.run(cmd).stdout,
+                                          store=JobRecordStore(records_path))
+        self.scratch_indexes = {}  # ScratchIndex by scratch root
+        # Output files of the jobs in view are located in the background, one job at a time, while
+        # nothing else is waiting. Their last modification time is checked again every ten seconds.
+        self.output_files = {}  # job ID to probe result of its output file, with the time it was checked
+        self.output_recheck_interval = 10
+        self.queue_jobs = []  # slurm.QueueJob in the queue view
+        self.output_extensions = self.parent.current_settings["extensions"]["output"]  # output_files were located with these
+        self.speculative_jobs = []  # job IDs whose output files are still to be located
+        self.speculative_tried = {}  # job ID to time.time() of the last try, tried again after five minutes
+        self.speculative_retry_interval = 300
+        self.downloads = DownloadCache()  # output files are downloaded again only from where they grew
+        self.queue_stream = None  # agent.AgentRequest of the queue stream from the remote agent
+        self.job_counts = (0, 0)  # running and pending jobs of the logged in user
 
         # Place the widgets
         self.place_widgets()
+        self.start_remote_agent()
 
         # Print the queue and start monitoring functions
         self.print_q()
         self.monitor_q()
         self.monitor_selected_text()
+        self.sample_cpu_usage()
+        self.refresh_last_writes()
         self.log_update(f"Welcome to {self.parent.name}!")
+        self.parent.debug(f"Periodic tasks live: {TimerRegistry.live()}")
 
     def place_widgets(self):
         # Configure columns and rows. Allow for resizing in appropriate directions
@@ -136,6 +186,10 @@ class MainWindow(tk.Frame):
         q_xscrollbar.config(command=self.txt.xview)
         log_yscrollbar.config(command=self.log.yview)
 
+        # The queue and job history are shown through a view that only inserts the visible rows,
+        # and takes over the vertical scroll bar while they are shown
+        self.view = VirtualView(self.txt, q_yscrollbar, on_window=self.resolve_visible_outputs)
+
         # Set up tags for color coding various outputs in the main Text box
         self.txt.tag_configure("job_completed", foreground="#59aeff")
         self.txt.tag_configure("job_pending", foreground="#fdbf2c")
@@ -200,19 +254,51 @@ class MainWindow(tk.Frame):
         entry.grid(row=0, column=0)
         entry.focus()
 
+    def start_remote_agent(self):
+        """
+        Start or stop the remote agent according to the settings. Starting involves an upload,
+        so it is done in the background.
+        :return:
+        """
+        def report(running):
+            if self.parent.remote_agent.get() and not running:
+                self.log_update("Remote agent could not be started. Falling back to shell commands.")
+            if running:
+                self.executor.submit(self.start_queue_stream)
+
+        self.executor.submit(self.session.use_remote_agent, self.parent.remote_agent.get(), callback=report)
+
+    def destroy(self):
+        """
+        Stop all periodic tasks and remote requests of this window before destroying it.
+        """
+        self.timers.cancel_all()
+        self.executor.shutdown()
+        if self.queue_stream is not None and self.session.agent is not None:
+            try:
+                self.session.agent.unsubscribe(self.queue_stream)
+            except AgentUnavailable:
+                pass
+        for store in self.history_stores.values():
+            store.close()
+        self.job_records.store.close()
+        tk.Frame.destroy(self)
+
     def switch_cluster(self, cluster, *args):
+        # The session stays alive in the session pool, so switching back is instant
         self.destroy()
         self.parent.login_window.authorize(cluster)
 
     def logout(self, *args):
         """
-        Close ssh connection and show the Login window.
+        Show the Login window and destroy this window, which stops its periodic tasks and
+        remote requests. The session is kept in the session pool until it expires.
 
         :param args: event from keyboard shortcut
         :return:
         """
-        self.ssh_client.close()
         self.parent.show_login()
+        self.destroy()
 
     def update_filter_mode(self, *args):
         self.parent.filter_mode.set(next(self.filter_mode_gen))
@@ -231,12 +317,17 @@ class MainWindow(tk.Frame):
                 self.selected_text.set(s_new)
                 self.label_selected_text["text"] = f"Last selected job: {s_new}"
 
-                outputfile = self.locate_output_file(s_new)
-                self.output_last_update.set(self.get_last_update(outputfile))
+                # Only the last selection is of interest
+                self.executor.cancel("selection")
+                scratch_location = self.get_scratch()
+                outputfile_ext = self.parent.current_settings["extensions"]["output"].split()
+                self.executor.submit(self.fetch_last_update, s_new, scratch_location, outputfile_ext,
+                                     callback=self.output_last_update.set,
+                                     tag="selection")
         except (ValueError, TypeError):
             pass
 
-        self.master.after(300, self.monitor_selected_text)
+        self.timers.after("monitor_selected_text", 300, self.monitor_selected_text)
 
     def launch_preferences(self, *args):
         """
@@ -247,9 +338,95 @@ class MainWindow(tk.Frame):
         return Preferences(self)
 
     def get_last_update(self, f):
-        cmd = f"ls -ltr {f}"
-        _, stdout, _ = self.ssh_client.exec_command(cmd)
-        return stdout.read().decode("ascii").split()[5:8]
+        st = self.probe_paths([f])[0]
+        return datetime.fromtimestamp(st["mtime"]).strftime("%b %d %H:%M").split() if st["exists"] else []
+
+    def resolve_visible_outputs(self, rows):
+        """
+        Locate the output files of the jobs in view in the background, starting a second after
+        they came into view. Pending jobs have no output yet, and are left out, and a job that was
+        tried is only tried again after speculative_retry_interval seconds.
+        :param rows: list of (job ID, line, tag), the rows in view
+        :return:
+        """
+        retry = time.time() - self.speculative_retry_interval
+        jobs = [jobid for jobid, line, tag in rows if tag != "job_pending" and self.speculative_tried.get(jobid, 0) < retry]
+        if jobs == self.speculative_jobs:
+            return
+
+        self.speculative_jobs = jobs
+        if not jobs:
+            self.timers.cancel("resolve_output")
+            self.executor.cancel("speculative")
+        elif "resolve_output" not in self.timers and not self.executor.pending("speculative"):
+            self.timers.after("resolve_output", 1000, self.resolve_next_output)
+
+    def resolve_next_output(self):
+        """
+        Locate the output file of the next job in view, unless the user is waiting for something else.
+        :return:
+        """
+        if self.executor.pending("view") or self.executor.pending("selection") or self.executor.pending("speculative"):
+            self.timers.after("resolve_output", 1000, self.resolve_next_output)
+            return
+        if not self.speculative_jobs:
+            return
+
+        scratch_location = self.get_scratch(quiet=True)
+        if "ErrorCode_" in scratch_location:
+            self.speculative_tried.update(dict.fromkeys(self.speculative_jobs, time.time()))
+            self.speculative_jobs = []
+            return
+
+        jobid = self.speculative_jobs.pop(0)
+        self.speculative_tried[jobid] = time.time()
+        outputfile_ext = self.parent.current_settings["extensions"]["output"].split()
+        self.executor.submit(self.find_output_file, jobid, scratch_location, outputfile_ext, quiet=True,
+                             callback=self.resolve_output_done,
+                             errback=self.resolve_output_done,
+                             tag="speculative")
+
+    def resolve_output_done(self, result):
+        # A short pause between jobs keeps the background work from crowding the connection
+        self.timers.after("resolve_output", 200, self.resolve_next_output)
+
+    def probe_paths(self, paths):
+        """
+        Check which of many remote paths exist, in a single round trip. Blocks on the round trip.
+        Background work calls it from worker threads, but locate_input_file and open_submitscript
+        call it from the Tk thread, through probe_first, as the user is waiting for the file anyway.
+        :param paths: list of str
+        :return: list of dict with path, exists, and size, mtime and is_dir if it exists, in the order of paths
+        """
+        if not paths:
+            return []
+        self.parent.debug(f"Probing {', '.join(paths)}")
+        if self.session.agent is not None:
+            return self.session.agent.call("stat", paths=paths)
+        return helpers.parse_stat(self.session.run(helpers.stat_command(paths)).stdout, paths)
+
+    def probe_first(self, paths):
+        """
+        :param paths: list of str, candidates in order of preference
+        :return: str, the first of paths that exists. None if none of them exists
+        """
+        for st in self.probe_paths(paths):
+            if st["exists"]:
+                return st["path"]
+        return None
+
+    def fetch_last_update(self, pid, scratch_location, outputfile_ext):
+        """
+        Locate the output file of a job and get the time of its last modification.
+        Runs in a worker thread.
+        """
+        outputfile = self.find_output_file(pid, scratch_location, outputfile_ext)
+        if "ErrorCode_" in outputfile:
+            return []
+        st = self.output_files.get(pid)
+        if st is None or time.time() - st["checked"] > self.output_recheck_interval:
+            return self.get_last_update(outputfile)
+        return datetime.fromtimestamp(st["mtime"]).strftime("%b %d %H:%M").split()
 
     def show_user_manual(self):
         self.current_file.set("")
@@ -309,23 +486,170 @@ class MainWindow(tk.Frame):
         :param args: Event from Check box
         :return:
         """
-        cmd = f"squeue -u {self.parent.user.get()} -o '%.20T'"
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        q = stdout.readlines()
-        status = map(lambda x: x.strip(), q[1:])
+        self.poller.interval = self.parent.queue_monitor_update_frequency.get()
+        self.poller.minimum = self.parent.queue_monitor_min_update_frequency.get()
+        # The snapshot stays fresh until the next poll, which is later while the poller is backed off
+        self.snapshot.ttl = self.poller.current / 1000
+
+        # Changes are pushed by the remote agent, so only check every now and then that the stream is alive.
+        # The snapshot stays fresh while it is, and the queue view is redrawn to advance the elapsed times.
+        self.snapshot.streaming = self.queue_stream is not None and not self.queue_stream.done()
+        if self.snapshot.streaming:
+            if self.do_queue_monitoring.get():
+                self.print_q()
+            self.timers.after("monitor_q", self.poller.interval, self.monitor_q)
+            return
+
+        # The next poll is scheduled when this one is done, so that its interval can adapt to the result
+        self.executor.submit(self.snapshot.refresh,
+                             callback=self.monitor_q_done,
+                             errback=self.monitor_q_failed,
+                             tag="monitor")
+
+    def schedule_monitor_q(self, changed=False):
+        """
+        Schedule the next poll of the queue. The interval grows while the queue is unchanged and
+        the window is not focused, and shrinks right after jobs changed state.
+        :param changed: bool, whether the last poll saw jobs change state
+        :return:
+        """
+        interval = self.poller.next(changed, focused=self.focus_displayof() is not None)
+        self.snapshot.ttl = interval / 1000
+        self.timers.after("monitor_q", interval, self.monitor_q)
+
+    def monitor_q_done(self, jobs):
+        self.update_queue_views(jobs)
+        self.schedule_monitor_q(self.snapshot.changed)
 
-        running, pending = 0, 0
-        for s in status:
-            if s == "RUNNING":
-                running += 1
-            elif s == "PENDING":
-                pending += 1
+    def monitor_q_failed(self, e):
+        self.log_update(f"Could not get the queue: {e}")
+        self.schedule_monitor_q()
+
+    def poll_soon(self):
+        """
+        Poll the queue as soon as allowed, e.g. after jobs were killed or submitted.
+        :return:
+        """
+        self.snapshot.invalidate()
+        self.poller.burst()
+        if "monitor_q" in self.timers:  # otherwise a poll is running, and will schedule the next one
+            self.schedule_monitor_q()
+
+    def update_queue_views(self, jobs):
+        """
+        Update the job counters from a new queue snapshot, and the queue view if it is monitored.
+        :param jobs: list of slurm.QueueJob
+        :return:
+        """
+        self.job_counts = slurm.count_states(slurm.select_jobs(jobs, self.parent.user.get()))
+        # The snapshot only holds the jobs of the logged in user, so the jobs of the queue view,
+        # which may be of any user, are kept too
+        states = {job.jobid: job.state for job in self.queue_jobs}
+        states.update((job.jobid, job.state) for job in jobs)
+        self.job_records.sync(states)
+        # The rows of the job history view are in neither, and their output files are kept as well
+        self.forget_output_files(states.keys() | {key for key, _, _ in self.view.rows})
+        #self.label_monitor_q["text"] = f"Running: {self.job_counts[0]}\nPending: {self.job_counts[1]}"
 
         if self.do_queue_monitoring.get():
             self.print_q()
 
-        #self.label_monitor_q["text"] = f"Running: {running}\nPending: {pending}"
-        self.master.after(self.parent.queue_monitor_update_frequency.get(), self.monitor_q)
+    def forget_output_files(self, keep):
+        """
+        Forget the located output files, and the tries to locate them, of jobs that left the queue
+        and are not in view.
+        :param keep: collection of str, IDs of the jobs that are still in the queue or in view
+        :return:
+        """
+        for jobid in list(self.output_files):
+            if jobid not in keep:
+                self.output_files.pop(jobid, None)
+        for jobid in list(self.speculative_tried):
+            if jobid not in keep:
+                self.speculative_tried.pop(jobid, None)
+
+    def check_output_extensions(self):
+        """
+        Forget all located output files if the output file extensions have changed in the settings,
+        as the files found before may not be the ones the new extensions point to.
+        :return:
+        """
+        extensions = self.parent.current_settings["extensions"]["output"]
+        if extensions != self.output_extensions:
+            self.output_extensions = extensions
+            self.output_files.clear()
+            self.speculative_tried.clear()
+
+    def refresh_last_writes(self):
+        """
+        Check when the output files of the running jobs in view were last written, with a single probe,
+        for the LAST_WRITE column of the queue. Only output files that have been located are checked.
+        Runs periodically while the queue is monitored, also when the queue itself does not change.
+        :return:
+        """
+        if self.do_queue_monitoring.get() and not self.executor.pending("last_write"):
+            jobids = [job.jobid for job in self.queue_jobs if job.state == "RUNNING" and job.jobid in self.output_files]
+            if jobids:
+                self.executor.submit(self.probe_output_files, jobids, callback=self.last_writes_probed, tag="last_write")
+
+        self.timers.after("refresh_last_writes", self.output_recheck_interval * 1000, self.refresh_last_writes)
+
+    def probe_output_files(self, jobids):
+        """
+        Update the located output files of jobs. Runs in a worker thread.
+        :param jobids: list of str, jobs in self.output_files
+        :return: bool, whether any of them was written since the last check
+        """
+        # Entries may be dropped by other threads meanwhile, so they are only looked up once
+        located = [(jobid, self.output_files.get(jobid)) for jobid in jobids]
+        located = [(jobid, previous) for jobid, previous in located if previous is not None]
+        checked = time.time()
+        changed = False
+        for (jobid, previous), st in zip(located, self.probe_paths([previous["path"] for _, previous in located])):
+            if st["exists"]:
+                changed = changed or st["mtime"] != previous["mtime"]
+                self.output_files[jobid] = dict(st, checked=checked)
+            else:
+                self.output_files.pop(jobid, None)  # e.g. the scratch directory was cleaned up
+                changed = True
+        return changed
+
+    def last_writes_probed(self, changed):
+        if changed and self.do_queue_monitoring.get():
+            self.print_q()
+
+    def start_queue_stream(self):
+        """
+        Let the remote agent push queue changes, instead of polling the queue. Runs in a worker thread.
+        :return:
+        """
+        agent = self.session.agent
+        if agent is None or (self.queue_stream is not None and not self.queue_stream.done()):
+            return
+        self.queue_stream = agent.subscribe("watch_queue", self.on_queue_event, user=self.snapshot.user,
+                                            interval=self.poller.interval / 1000)
+
+    def on_queue_event(self, event):
+        """
+        Apply a change pushed by the queue stream to the snapshot. Runs in the agent's reader thread.
+        :param event: dict, see remote_agent.watch_queue
+        :return:
+        """
+        jobs = self.snapshot.apply([slurm.make_job(**job) for job in event["jobs"]], event["removed"], event["full"],
+                                   event.get("times"))
+        self.executor.post(self.update_queue_views, jobs)
+
+    def fetch_queue(self, user, status="all"):
+        """
+        Get the jobs of a user from the cluster in a single query. Runs in a worker thread.
+        :param user: str, user name. "all" for all users
+        :param status: str, state filter passed to squeue -t
+        :return: list of slurm.QueueJob
+        """
+        if self.session.agent is not None:
+            return [slurm.make_job(**job) for job in self.session.agent.call("queue", user=user, states=status)]
+
+        return slurm.parse_squeue(self.session.run(slurm.squeue_command(user=user, status=status)).stdout)
 
     def print_q(self, *args):
         """
@@ -346,47 +670,16 @@ class MainWindow(tk.Frame):
                     break
             return
 
-        # First determine the longest job name and pid length so that we can
-        # adjust the squeue command to fit all job names
-        cmd = "squeue -t {} -u {} -o '%.20i %.300j'".format(self.status.get(), self.user.get())
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        q = stdout.readlines()
-
-        namelengths, pidlengths = [], []
-        for line in q:
-            pidlengths.append(len(line.split()[0].strip()))
-            namelengths.append(len(line.split()[1].strip()))
-        maxname = max(namelengths)
-        maxpid = max(pidlengths)
-
-        # Now get the actual queue that we want, and color code based on status
-        if self.user.get() == "all":
-            cmd = "squeue -t {} -S i -o '%.40j %.{}i %.9P %.8T %.8u %.10M %.10l %.6D %R'".format(self.status.get(),
-                                                                                                 maxpid + 1)
+        # Any pending view request is superseded by this one. The queue of the monitored user is only
+        # fetched if the snapshot is stale, the queue of anyone else is fetched on demand.
+        self.executor.cancel("view")
+        jobs = self.snapshot.cached(self.user.get(), self.status.get())
+        if jobs is not None:
+            self.render_q(jobs)
+        elif self.snapshot.covers(self.user.get()):
+            self.executor.submit(self.snapshot.get, self.user.get(), self.status.get(), callback=self.render_q, tag="view")
         else:
-            cmd = "squeue -u {} -t {} -S i -o '%.{}j %.{}i %.9P %.8T %.8u %.10M %.10l %.6D %R'".format(self.user.get(),
-                                                                                                       self.status.get(),
-                                                                                                       maxname + 1,
-                                                                                                       maxpid + 1)
-
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        q = stdout.readlines()
-
-        self.txt.config(state=tk.NORMAL)
-        self.txt.delete(1.0, tk.END)
-        for i, job in enumerate(q):
-            self.txt.insert(tk.END, job)
-
-            if "RUNN" in job.split()[3]:
-                self.txt.tag_add("job_running", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-            elif "PEND" in job.split()[3]:
-                self.txt.tag_add("job_pending", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-            elif "TIME" in job.split()[3]:
-                self.txt.tag_add("job_timeout", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-            elif "COMPL" in job.split()[3]:
-                self.txt.tag_add("job_completed", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-            elif "CANCEL" in job.split()[3]:
-                self.txt.tag_add("job_cancelled", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
+            self.executor.submit(self.fetch_queue, self.user.get(), self.status.get(), callback=self.render_q, tag="view")
 
         # now make sure the current status shown in the drop down menu corresponds to the same status used for the last job history command
         for stat, opt in self.status_options.items():
@@ -394,6 +687,40 @@ class MainWindow(tk.Frame):
                 self.status.set(stat)
                 break
 
+    def render_q(self, jobs):
+        """
+        Print queue to main text box, and color code based on status
+        :param jobs: list of slurm.QueueJob
+        :return:
+        """
+        # Only the visible rows that changed since the last render are touched, which keeps
+        # the selection, scroll position and sort order, and makes an unchanged queue free to render
+        last_write = {}
+        for job in jobs:
+            st = self.output_files.get(job.jobid) if job.state == "RUNNING" else None
+            if st is not None:
+                last_write[job.jobid] = st["mtime"]
+        self.queue_jobs = jobs
+        header, lines = slurm.format_queue(jobs, last_write)
+        self.view.show(header, [(job.jobid, line, slurm.state_tag(job.state)) for job, line in zip(jobs, lines)])
+        self.prefetch_job_records([job.jobid for job in jobs])
+
+    def prefetch_job_records(self, jobids):
+        """
+        Fetch the job records of the jobs in view that have none in the background, in a single
+        round trip, so selecting a job and opening its files needs no scontrol call of its own.
+        :param jobids: list of str
+        :return:
+        """
+        missing = self.job_records.missing(jobids)
+        if not missing or self.executor.pending("prefetch"):
+            return
+        self.parent.debug(f"Prefetching job records of {len(missing)} jobs")
+        run_batch = lambda cmds: [result.stdout for result in helpers.run_batch(self.ssh_client, cmds)]
+        self.executor.submit(self.job_records.prefetch, run_batch, missing,
+                             errback=lambda e: self.parent.debug(f"Prefetching job records failed: {e}"),
+                             tag="prefetch")
+
     def get_jobhistory(self, *args):
         """
         Print user job history in main Text box.
@@ -406,93 +733,22 @@ class MainWindow(tk.Frame):
 
         self.log_update("Showing job history for {} starting from {}".format(self.user.get(), self.job_starttime.get()))
 
-        # obtain the length of the job with the longest name
-        cmd = "sacct -u {} --format='JobName%300,JobID%40' --starttime {}".format(self.user.get(),
-                                                                                  self.job_starttime.get())
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        jobhis = stdout.readlines()
-
-        namelengths = []
-        pidlengths = []
-        for job in jobhis[2:]:
-            namelengths.append(len(job.split()[0].strip()))
-            if "proxy" not in job.split()[0] and ".batch" not in job.split()[1]:
-                pidlengths.append(len(job.split()[1].strip()))
-
-        if len(namelengths) == 0:
-            self.log_update(
-                "Job history is empty. Try selecting an earlier start time in the drop down menu. ErrorCode_hyx916")
-
-            # now make sure the current status shown in the drop down menu corresponds
-            # to the same status used for the last job history command
-            for stat, opt in self.status_options.items():
-                if self.status.get() == opt:
-                    self.status.set(stat)
-                break
-            return "ErrorCode_hyx916"
-        maxname = max(namelengths)
-        maxpid = max(pidlengths)
-
         if self.user.get().strip() == "":
             self.log_update("No user selected. ErrorCode_hus28")
-            return "ErrorCode_hus28"
-
-        if self.status.get() == self.status_options["All Jobs"]:
-            cmd = "sacct -u {} --starttime {} --format='Jobname%{},JobID%{},User,state%10,time,nnodes%3,CPUTime,elapsed,Start,End'".format(
-                self.user.get(), self.job_starttime.get(), maxname + 1, maxpid + 1)
+            history = "ErrorCode_hus28"
         else:
-            cmd = "sacct -u {} -s {} --starttime {} --format='Jobname%{},JobID%{},User,state%10,time,nnodes%3,CPUTime,elapsed,Start,End'".format(
-                self.user.get(), self.status.get(), self.job_starttime.get(), maxname + 1, maxpid + 1)
-
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        jh = stdout.readlines()
-
-        # now get rid of useless lines in the history
-        history = [jh[0]]  # start with the header present in the list
-        for line in jh:
-            try:
-                int(line.split()[1])
-                history.append(line)
-            except ValueError:
-                if "." in line.split()[1]:
-                    continue
-                elif "proxy" in line.split()[0]:
-                    continue
-                elif "batch" in line.split()[0]:
-                    continue
-                else:
-                    history.append(line)
-
-        self.txt.config(state=tk.NORMAL)
-        self.txt.delete(1.0, tk.END)
-
-        # make sure the header will be printed regardless  of filter options
-        self.txt.insert(tk.END, history[0])
-
-        for i, line in enumerate(history[2:]):
-            # if entry filter is empty
-            if self.jobhisfilter.get().strip() == "":
-                self.txt.insert(tk.END, line)
-            # if filter is to be applied
+            # Any pending view request is superseded by this one. The history is queried
+            # locally, and only synced with the cluster first if the last sync is too old.
+            self.executor.cancel("view")
+            store = self.jobhistory_store(self.user.get())
+            query = (self.status.get(), self.job_starttime.get(), self.jobhisfilter.get().split())
+            if store.is_synced(self.job_starttime.get(), self.history_sync_interval):
+                self.render_jobhistory(store.query(*query))
             else:
-                for f in self.jobhisfilter.get().strip().split():
-                    if f in line:
-                        self.txt.insert(tk.END, line)
-
-        for i, line in enumerate(self.txt.get(1.0, tk.END).splitlines()):
-            try:
-                if "RUNN" in line.split()[3]:
-                    self.txt.tag_add("job_running", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-                elif "PENDI" in line.split()[3]:
-                    self.txt.tag_add("job_pending", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-                elif "TIMEO" in line.split()[3]:
-                    self.txt.tag_add("job_timeout", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-                elif "COMPLE" in line.split()[3]:
-                    self.txt.tag_add("job_completed", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-                elif "CANCEL" in line.split()[3]:
-                    self.txt.tag_add("job_cancelled", "{}.0".format(i + 1), "{}.{}".format(i + 1, tk.END))
-            except IndexError:
-                continue
+                self.executor.submit(self.fetch_jobhistory, store, self.user.get(), *query,
+                                     callback=self.render_jobhistory,
+                                     tag="view")
+            history = None
 
         # now make sure the current status shown in the drop down menu corresponds
         # to the same status used for the last job history command
@@ -500,26 +756,107 @@ class MainWindow(tk.Frame):
             if self.status.get() == opt:
                 self.status.set(stat)
                 break
+        return history
+
+    def jobhistory_store(self, user):
+        """
+        Get the local job history database of a user on the current cluster.
+        :param user: str
+        :return: JobHistoryStore
+        """
+        if user not in self.history_stores:
+            self.history_stores[user] = JobHistoryStore(self.local_path(f"jobhistory_{self.parent.host.get()}_{user}.sqlite"))
+        return self.history_stores[user]
+
+    def local_path(self, filename):
+        """
+        :param filename: str
+        :return: str, path to a local file next to the settings file, or with the temporary
+                 files if QueueGui has no home directory
+        """
+        directory = os.path.dirname(self.parent.path_to_settings_file.get())
+        if not os.path.isdir(directory):
+            directory = self.parent.tmp
+        return os.path.join(directory, filename)
+
+    def fetch_jobhistory(self, store, user, status, starttime, keywords):
+        """
+        Sync the local job history with the cluster, and query it. Runs in a worker thread.
+        :param store: JobHistoryStore
+        :param user: str
+        :param status: str, status option, see JobHistoryStore.query
+        :param starttime: str, date as YYYY-MM-DD
+        :param keywords: list of str, see JobHistoryStore.query
+        :return: list of sacct.SacctJob
+        """
+        store.sync(lambda cmd: self.session.run(cmd).stdout, user, starttime)
+        return store.query(status, starttime, keywords)
+
+    def render_jobhistory(self, jobs):
+        """
+        Print job history in main Text box, and color code based on status
+        :param jobs: list of sacct.SacctJob
+        :return:
+        """
+        if not jobs:
+            self.log_update(
+                "Job history is empty. Try selecting an earlier start time in the drop down menu. ErrorCode_hyx916")
+            return
+
+        header, lines = format_history(jobs)
+        self.view.show(header, [(job.jobid, line, slurm.state_tag(job.state)) for job, line in zip(jobs, lines)])
+
+        # scontrol has forgotten most of these jobs, so their records are fetched from sacct up front
+        finished = self.job_records.missing([job.jobid for job in jobs if job.state in slurm.FINAL_STATES])
+        if finished and not self.executor.pending("prefetch"):
+            self.executor.submit(self.job_records.fetch_finished, finished,
+                                 errback=lambda e: self.parent.debug(f"Fetching finished job records failed: {e}"),
+                                 tag="prefetch")
 
     def download_file(self, f):
         """
-        Download the file to the temporary directory
+        Download the file to the temporary directory. If it was downloaded before, only
+        what was appended to it since then is downloaded. Runs in a worker thread.
         :param f: str, path to file to download
         :return: str, path to downloaded file
         """
         destination = os.path.join(self.parent.tmp, helpers.remote_stem(f))
-        self.sftp_client.get(f, destination)
+        read = None
+        if self.session.agent is not None:
+            read = lambda path, offset, length: base64.b64decode(
+                self.session.agent.call("read", path=path, offset=offset, length=length)["data"])
+        return self.downloads.fetch(self.sftp_client, f, destination, read)
+
+    def with_output_file(self, pid, func):
+        """
+        Locate and download the output file of a job in the background, and then call
+        func(pid, outputfile, destination) on the Tk thread. Nothing is called if the
+        output file was not found.
+        :param pid: Job ID for job
+        :param func: callable
+        :return:
+        """
+        self.user.set(self.entry_user.get())
+        scratch_location = self.get_scratch()
+        outputfile_ext = self.parent.current_settings["extensions"]["output"].split()
+        self.executor.submit(self.download_output_file, pid, scratch_location, outputfile_ext,
+                             callback=lambda paths: None if isinstance(paths, str) else func(pid, *paths))
 
-        return destination
+    def download_output_file(self, pid, scratch_location, outputfile_ext):
+        """
+        Locate and download the output file of a job. Runs in a worker thread.
+        :return: tuple, path to the output file and to the downloaded file, or error code
+        """
+        outputfile = self.find_output_file(pid, scratch_location, outputfile_ext)
+        if "ErrorCode_" in outputfile:
+            return outputfile
+        return outputfile, self.download_file(outputfile)
 
     def geometry_convergence(self, *args):
         self.parent.debug(f"INSPECTING GEOMETRY CONVERGENCE", header=True)
-        pid = self.selected_text.get()
-        outputfile = self.locate_output_file(pid)
-        destination = os.path.join(self.master.tmp, os.path.basename(outputfile))
-
-        self.sftp_client.get(outputfile, destination)
+        self.with_output_file(self.selected_text.get(), self.plot_geometry_convergence)
 
+    def plot_geometry_convergence(self, pid, outputfile, destination):
         G, O, M = self.determine_job_software(destination)
 
         if M:
@@ -610,87 +947,65 @@ class MainWindow(tk.Frame):
         :return:
         """
         self.current_file.set("")
-        cmd = "squeue -o '%u %C %t'"
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        q = stdout.readlines()
 
-        cpus_total = self.parent.cluster_data[self.master.host.get()]["number_of_cpus"]
+        # Any pending view request is superseded by this one. The queue snapshot only holds the jobs
+        # of one user, so the sums are fetched for the whole cluster.
+        self.executor.cancel("view")
+        self.executor.submit(self.fetch_cpu_usage, callback=self.render_cpu_usage, tag="view")
+
+    def fetch_cpu_usage(self):
+        """
+        Get the running and pending CPUs per user and partition, summed on the cluster. Runs in a worker thread.
+        :return: list of slurm.CpuUsage
+        """
+        if self.session.agent is not None:
+            return [slurm.CpuUsage(**u) for u in self.session.agent.call("cpu_usage")]
+
+        return slurm.parse_cpu_usage(self.session.run(slurm.CPU_USAGE_COMMAND).stdout)
+
+    def sample_cpu_usage(self):
+        """
+        Record the CPU usage in the history, if enabled. Runs periodically, and only fetches the sums.
+        :return:
+        """
+        if self.parent.cpu_usage_history.get() and not self.executor.pending("sampler"):
+            self.executor.submit(self.fetch_cpu_usage, callback=self.record_cpu_usage, tag="sampler")
 
-        # Get jobs in queue
-        jobs_all = [line.split() for line in q]
-        jobs_running = [job for job in jobs_all if job[-1] == "R"]
-        jobs_pending = [job for job in jobs_all if job[-1] == "PD"]
-
-        # Initialize list to contain the users from all jobs
-        users = sorted(set([job[0] for job in jobs_all]))
-
-        # Initialize a dict in which the sum of all CPUs will be accumulated
-        cpu_running = {user: 0 for user in users}
-        cpu_pending = {user: 0 for user in users}
-
-        # perform the sum for running cpus
-        for job in jobs_running:
-            for user in cpu_running.keys():
-                if user in job:
-                    cpu_running[user] += int(job[1])
-        # and for pending cpus
-        for job in jobs_pending:
-            for user in cpu_running.keys():
-                if user in job:
-                    cpu_pending[user] += int(job[1])
-
-        # Zip list of users, list of running cpus, and list of pending cpus.
-        # Then sort based on list of running cpus.
-        zipped = sorted(
-            zip(cpu_running.keys(), [c for user, c in cpu_running.items()], [c for user, c in cpu_pending.items()]),
-            key=lambda x: x[1], reverse=True)
-
-        # Unzip
-        user, cpu_running, cpu_pending = zip(*zipped)
-
-        # get ratio of running cpus to cluster's total to 4 digits
-        oftotal = [str(float(i) / cpus_total * 100)[:5] for i in cpu_running]
+        self.timers.after("sample_cpu_usage", self.cpu_sample_interval, self.sample_cpu_usage)
+
+    def record_cpu_usage(self, usage):
+        self.cpu_history.add(time.time(), usage)
+
+    def render_cpu_usage(self, usage):
+        """
+        Display the running and pending CPUs of each user in a table, split by partition.
+        :param usage: list of slurm.CpuUsage
+        :return:
+        """
+        cpus_total = self.parent.cluster_data[self.master.host.get()]["number_of_cpus"]
+        header, rows, total = slurm.format_cpu_usage(usage, cpus_total)
+        line = "-" * len(header)
 
         # Get the users to highlight
         user_special = self.parent.cpu_usage_highlight_users.get().split()
 
-        # Now insert data
-        # In order to align the columns, we find the longes names in each column
-        maxlen = (max(len(x) for x in user),
-                  max(len(str(x)) for x in cpu_running),
-                  max(len(str(x)) for x in oftotal),
-                  max(len(str(x)) for x in cpu_pending))
-
         self.txt.config(state=tk.NORMAL)
         self.txt.delete(1.0, tk.END)
-        self.txt.insert(tk.END, "-"*(18 + maxlen[0] - 4 + maxlen[1] - 3 + maxlen[2] - 1) + "\n")
-        self.txt.insert(tk.END, f"User {' '*(maxlen[0] - 4)} Run {' '*(maxlen[1] - 3)} % {' '*(maxlen[2] - 1)} Pend\n")
-        self.txt.insert(tk.END, "-"*(18 + maxlen[0] - 4 + maxlen[1] - 3 + maxlen[2] - 1) + "\n")
-
-        for i, u in enumerate(user):
-            self.txt.insert(tk.END, "{} {} {} {} {} {} {}\n".format(u,
-                                                                    (maxlen[0] - len(user[i])) * " ",
-                                                                    cpu_running[i],
-                                                                    (maxlen[1] - len(str(cpu_running[i]))) * " ",
-                                                                    oftotal[i],
-                                                                    (maxlen[2] - len(oftotal[i])) * " ",
-                                                                    cpu_pending[i]))
+        self.txt.insert(tk.END, f"{line}\n{header}\n{line}\n")
+
+        for i, (u, row) in enumerate(rows):
+            self.txt.insert(tk.END, row + "\n")
             if u in user_special:  # make special users red
                 self.txt.tag_add("special_user", "{}.0".format(i + 4), "{}.{}".format(i + 4, tk.END))
                 if u == user_special[0]:  # make first special user green
                     self.txt.tag_add("superspecial_user", "{}.0".format(i + 4), "{}.{}".format(i + 4, tk.END))
 
-        self.txt.insert(tk.END, "-"*(18 + maxlen[0] - 4 + maxlen[1] - 3 + maxlen[2] - 1) + "\n")
+        self.txt.insert(tk.END, f"{line}\n{total}\n{line}\n")
 
-        # convert back to floats for the summation
-        oftotal = [float(t) for t in oftotal]
-        self.txt.insert(tk.END, "SUM: {} {} {} {} {} {}\n".format((maxlen[0] - 4) * " ",
-                                                                  str(sum(cpu_running))[:5],
-                                                                  (maxlen[1] - len(str(sum(cpu_running)))) * " ",
-                                                                  str(sum(oftotal))[:5],
-                                                                  (maxlen[2] - len(str(sum(oftotal)))) * " ",
-                                                                  str(sum(cpu_pending))[:5]))
-        self.txt.insert(tk.END, "-"*(18 + maxlen[0] - 4 + maxlen[1] - 3 + maxlen[2] - 1) + "\n")
+        # Trends are drawn from the history in memory
+        if self.parent.cpu_usage_history.get() and len(self.cpu_history) > 1:
+            trends = format_trends(self.cpu_history, [u for u, _ in rows], time.time())
+            self.txt.insert(tk.END, "\n" + "\n".join(trends) + "\n")
 
     def locate_output_file(self, pid):
         """
@@ -701,55 +1016,86 @@ class MainWindow(tk.Frame):
         """
         self.user.set(self.entry_user.get())
         scratch_location = self.get_scratch()
+        outputfile_ext = self.parent.current_settings["extensions"]["output"].split()
+        return self.find_output_file(pid, scratch_location, outputfile_ext)
+
+    def find_output_file(self, pid, scratch_location, outputfile_ext, quiet=False):
+        """
+        Remote part of locate_output_file. Does not touch any widgets or Tk variables, so it
+        is safe to call from a worker thread. Output files that were found before are not searched for again.
+        :param pid: Job ID for job
+        :param scratch_location: str, root of the scratch area
+        :param outputfile_ext: list, extensions of output files
+        :param quiet: bool, only report failures in the debug output, e.g. when locating in the background
+        :return: Path, path to identified output file
+        """
+        st = self.output_files.get(pid)
+        if st is not None:
+            self.parent.debug(f"Output file of pid={pid} already located: {st['path']}")
+            return st["path"]
+
+        report = self.parent.debug if quiet else self.log_update
         jobname = self.get_jobname(pid)
 
         self.parent.debug("----------------------------------------")
         self.parent.debug("Locating output file")
-        self.parent.debug(f"User: {self.user.get()}")
         self.parent.debug(f"Scratch location: {scratch_location}")
 
+        if scratch_location not in self.scratch_indexes:
+            self.scratch_indexes[scratch_location] = ScratchIndex(scratch_location, self.list_remote_dir,
+                                                                  self.get_remote_mtime)
+        index = self.scratch_indexes[scratch_location]
+
         try:
-            all_scratch_dirs = self.sftp_client.listdir(scratch_location)
-            self.parent.debug(f"{len(all_scratch_dirs)} scratch directories will be searched.")
-        except IOError:
+            scratch = index.lookup(pid)
+            self.parent.debug(f"{len(index)} scratch directories are indexed.")
+        except (IOError, AgentError):
             self.parent.debug(f"This scratch location was not found: {scratch_location}")
-            self.log_update(f"Scratch location '{scratch_location}' not found. ErrorCode_jut81")
+            report(f"Scratch location '{scratch_location}' not found. ErrorCode_jut81")
             return "ErrorCode_jut81"
 
-        self.parent.debug(f"Searching for scratch directories that ends with pid={pid}:")
-        for scratch in all_scratch_dirs:
-            if scratch.endswith(pid):
-                self.parent.debug(f"Match found: {scratch}")
-                scratchdir = helpers.remote_join(scratch_location, scratch)
-                break
-        else:
+        if scratch is None:
             self.parent.debug(f"No scratch directories ended with pid={pid}")
-            self.log_update(f"Scratch directory for job {pid} not found. ErrorCode_hoq998")
+            report(f"Scratch directory for job {pid} not found. ErrorCode_hoq998")
             return "ErrorCode_hoq998"
+        self.parent.debug(f"Match found: {scratch}")
+        scratchdir = helpers.remote_join(scratch_location, scratch)
 
         # Now loop over extensions and look for a hit on an outputfile
         # Warning: if one of the user set extensions is used as something else than an output file
         # then you may get a false positive here, and the incorrect file is returned.
         # Be careful with what type of extensions you use.
-        outputfile_ext = self.parent.current_settings["extensions"]["output"].split()
         self.parent.debug(f"Searching for output files with these extensions: {', '.join(outputfile_ext)}")
 
-        for ext in outputfile_ext:
-            outputfile = helpers.remote_join(scratchdir, jobname+ext)
-            self.parent.debug(f"Output file to attempt: {outputfile}")
+        for st in self.probe_paths([helpers.remote_join(scratchdir, jobname+ext) for ext in outputfile_ext]):
+            if st["exists"]:
+                self.parent.debug(f"Found output file: {st['path']}")
+                self.output_files[pid] = dict(st, checked=time.time())
+                return st["path"]
 
-            try:
-                self.sftp_client.stat(outputfile)
-                self.parent.debug(f"Found output file: {outputfile}")
-                return outputfile
-            except IOError:
-                self.parent.debug(f"Did not find {outputfile}")
-                continue
-        else:
-            self.parent.debug(f"No output files found.")
-            self.log_update(f"No output file was found using these extensions: {', '.join(outputfile_ext)}")
-            self.log_update("ErrorCode_fov28")
-            return "ErrorCode_fov28"
+        self.parent.debug(f"No output files found.")
+        report(f"No output file was found using these extensions: {', '.join(outputfile_ext)}")
+        report("ErrorCode_fov28")
+        return "ErrorCode_fov28"
+
+    def list_remote_dir(self, path):
+        """
+        :param path: str
+        :return: list of str, names in the remote directory
+        """
+        if self.session.agent is not None:
+            return [entry["name"] for entry in self.session.agent.call("scandir", path=path, stat=False)["entries"]]
+        return self.sftp_client.listdir(path)
+
+    def get_remote_mtime(self, path):
+        """
+        :param path: str
+        :return: float, modification time of the remote path
+        """
+        st = self.probe_paths([path])[0]
+        if not st["exists"]:
+            raise IOError(f"{path} does not exist")
+        return st["mtime"]
 
     def locate_input_file(self):
         self.user.set(self.entry_user.get())
@@ -768,16 +1114,10 @@ class MainWindow(tk.Frame):
         inputfile_ext = self.parent.current_settings["extensions"]["input"].split()
         self.parent.debug(f"Searching for input files with these extensions: {', '.join(inputfile_ext)}")
 
-        for ext in inputfile_ext:
-            inputfile = helpers.remote_join(workdir, jobname+ext)
-            self.parent.debug(f"Input file attempt: {inputfile}")
-            try:
-                self.sftp_client.stat(inputfile)
-                self.parent.debug(f"Found {inputfile}")
-                return inputfile
-            except:
-                self.parent.debug(f"Did not find {inputfile}")
-                continue
+        inputfile = self.probe_first([helpers.remote_join(workdir, jobname+ext) for ext in inputfile_ext])
+        if inputfile is not None:
+            self.parent.debug(f"Found {inputfile}")
+            return inputfile
 
         self.log_update("Input file not found. ErrorCode_juq81")
         return "ErrorCode_juq81"
@@ -786,15 +1126,41 @@ class MainWindow(tk.Frame):
         self.current_file.set("")
         self.parent.debug(f"OPENING OUTPUT FILE", header=True)
         pid = self.selected_text.get()
-        outputfile = self.locate_output_file(pid)
+
+        # Locating and downloading is done in the background
+        self.user.set(self.entry_user.get())
+        scratch_location = self.get_scratch()
+        outputfile_ext = self.parent.current_settings["extensions"]["output"].split()
+        self.executor.cancel("view")
+        self.executor.submit(self.fetch_output, pid, scratch_location, outputfile_ext,
+                             callback=self.render_output,
+                             tag="view")
+
+    def fetch_output(self, pid, scratch_location, outputfile_ext):
+        """
+        Locate and download the output file of a job. Runs in a worker thread.
+        :return: list, lines of the output file, or error code
+        """
+        paths = self.download_output_file(pid, scratch_location, outputfile_ext)
+        if isinstance(paths, str):  # error code
+            return paths
 
         # It is significantly faster to actually download the output file
         # and open it locally (especially if the file is large).
+        outputfile, destination = paths
         self.log_update(f"Opening {outputfile}")
-        destination = self.download_file(outputfile)
 
         with open(destination) as f:
-            lines = f.readlines()
+            return f.readlines()
+
+    def render_output(self, lines):
+        """
+        Print the contents of an output file in the main Text box.
+        :param lines: list, lines of the output file, or error code
+        :return:
+        """
+        if isinstance(lines, str):  # error code
+            return
 
         self.txt.config(state=tk.NORMAL)
         self.txt.delete(1.0, tk.END)
@@ -806,12 +1172,9 @@ class MainWindow(tk.Frame):
 
     def open_visualizer(self, *args):
         self.parent.debug(f"OPENING OUTPUT IN VISUALIZER", header=True)
-        pid = self.selected_text.get()
-        outputfile = self.locate_output_file(pid)
-        destination = os.path.join(self.master.tmp, os.path.basename(outputfile))
-
-        self.sftp_client.get(outputfile, destination)
+        self.with_output_file(self.selected_text.get(), self.run_visualizer)
 
+    def run_visualizer(self, pid, outputfile, destination):
         G, O, M = self.determine_job_software(destination)
 
         if M:
@@ -840,14 +1203,14 @@ class MainWindow(tk.Frame):
     def mrchem_plot_convergence(self):
         pid = self.selected_text.get()
         self.jobhisfilter.set(self.entry_filter.get())
-        self.user.set(self.entry_user.get())
+        self.with_output_file(pid, lambda pid, outputfile, destination:
+                              MrchemOut(destination).plot_scf_energy(title=pid))
 
-        outputfile = self.locate_output_file(pid)
-        destination = os.path.join(self.parent.tmp, os.path.basename(outputfile))
-        self.sftp_client.get(outputfile, destination)
-        return MrchemOut(destination).plot_scf_energy(title=pid)
-
-    def get_scratch(self):
+    def get_scratch(self, quiet=False):
+        """
+        :param quiet: bool, only report a missing scratch setting in the debug output, e.g. in the background
+        :return: str, root of the scratch area of the cluster, or an ErrorCode
+        """
         if self.master.host.get() == "stallo":
             return helpers.remote_join(self.parent.current_settings["paths"]["scratch_stallo"], self.user.get())
         elif self.master.host.get() == "fram":
@@ -855,7 +1218,8 @@ class MainWindow(tk.Frame):
         elif self.master.host.get() == "saga":
             return self.parent.current_settings["paths"]["scratch_saga"]
 
-        self.log_update("Scratch not found. ErrorCode_lib73")
+        report = self.parent.debug if quiet else self.log_update
+        report("Scratch not found. ErrorCode_lib73")
         return "ErrorCode_lib73"
 
     def open_error(self):
@@ -900,21 +1264,18 @@ class MainWindow(tk.Frame):
 
         # Locate the submit script file. Common extensions are "job" and "launch"
         slurmscript_extensions = [".job", ".launch"]
-        for ext in slurmscript_extensions:
-            jobfile = helpers.remote_join(workdir, jobname+ext)
-            self.current_file.set(jobfile)
-            try:
-                with self.sftp_client.open(jobfile) as f:
-                    content = f.read()
-                    self.log_update("Opening {}".format(jobfile))
-                    self.txt.configure(state=tk.NORMAL)
-                    self.txt.delete(1.0, tk.END)
-                    self.txt.insert(1.0, content)
-                    break
-            except IOError:
-                if ext == slurmscript_extensions[-1]:
-                    self.log_update("Submit script file not found. ErrorCode_juq91")
-                    return "ErrorCode_juq91"
+        jobfile = self.probe_first([helpers.remote_join(workdir, jobname+ext) for ext in slurmscript_extensions])
+        if jobfile is None:
+            self.log_update("Submit script file not found. ErrorCode_juq91")
+            return "ErrorCode_juq91"
+
+        self.current_file.set(jobfile)
+        with self.sftp_client.open(jobfile) as f:
+            content = f.read()
+        self.log_update("Opening {}".format(jobfile))
+        self.txt.configure(state=tk.NORMAL)
+        self.txt.delete(1.0, tk.END)
+        self.txt.insert(1.0, content)
 
     def open_jobinfo(self):
         self.current_file.set("")
@@ -932,9 +1293,16 @@ class MainWindow(tk.Frame):
         if self.jobhisfilter.get().strip() == "":
             return self.log_update("The filter is empty")
 
+        _filter = self.entry_filter.get().split()
+        match = all if self.parent.filter_mode.get() == 0 else any
+
+        # The queue and job history are filtered from the rows they were rendered from,
+        # as only the visible rows are in the textbox
+        if self.view.is_shown():
+            return self.view.filter(lambda line: match([f in line for f in _filter]))
+
         # Collect whatever is currently in the textbox, and loop over it to filter
         current = self.txt.get(1.0, tk.END).splitlines()
-        _filter = self.entry_filter.get().split()
 
         # Filter based on the current filter mode
         # This can be set by the user by clicking on the
@@ -972,6 +1340,8 @@ class MainWindow(tk.Frame):
         if result is True:
             self.log_update(cmd)
             self.ssh_client.exec_command(cmd)
+            self.job_records.invalidate(pid)
+            self.poll_soon()
             self.print_q()
         else:
             return
@@ -987,6 +1357,8 @@ class MainWindow(tk.Frame):
         if result and result2:
             self.log_update(cmd)
             self.ssh_client.exec_command(cmd)
+            self.job_records.invalidate()
+            self.poll_soon()
         else:
             return
 
@@ -1000,8 +1372,9 @@ class MainWindow(tk.Frame):
 
         if messagebox.askyesno(self.parent.name, f"Are you sure you want to kill jobs in range {start} to {stop}?"):
             self.log_update(f"Killing all jobs in range {start} to {stop}")
-            for job in range(start, stop+1):
-                self.ssh_client.exec_command(f"scancel {job}")
+            helpers.run_batch(self.ssh_client, [f"scancel {job}" for job in range(start, stop+1)])
+            self.job_records.invalidate()
+            self.poll_soon()
         else:
             self.log_update("Kill aborted!")
 
@@ -1018,45 +1391,36 @@ class MainWindow(tk.Frame):
             return "ErrorCode_pol98"
 
     def get_jobname(self, pid):
+        """
+        :param pid: Job ID for job
+        """
         self.parent.debug(header=True)
         self.parent.debug(f"Searching for job name for pid={pid}")
 
-        cmd = "scontrol show jobid {}".format(pid)
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        info = stdout.read().decode('ascii').splitlines()
-
-        for line in info:
-            if line.strip().startswith("StdOut=/"):
-                jobname = os.path.splitext(os.path.basename(line.split("=", 1)[1]))[0]
-                self.parent.debug(f"Jobname found: {jobname}")
-                return jobname
+        jobname = self.job_records.get(pid).jobname
+        if jobname is not None:
+            self.parent.debug(f"Jobname found: {jobname}")
+        return jobname
 
     def get_workdir(self, pid):
+        """
+        :param pid: Job ID for job
+        """
         self.parent.debug(s="Searching for work directory", header=True)
-        cmd = "scontrol show jobid {}".format(pid)
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        output = stdout.read().decode('ascii').splitlines()
-
-        for line in output:
-            if line.strip().startswith("WorkDir"):
-                workdir = line.split("=", 1)[1]
-                self.parent.debug(f"Work directory found: {workdir}")
-                return workdir
-        else:
+
+        workdir = self.job_records.get(pid).workdir
+        if workdir is None:
             self.log_update("WorkDir not found. ErrorCode_nut62")
             return "ErrorCode_nut62"
+        self.parent.debug(f"Work directory found: {workdir}")
+        return workdir
 
     def get_jobstatus(self, pid):
-        cmd = f"scontrol show jobid {pid}"
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        output = stdout.read().decode('ascii').splitlines()
-
-        status = None
-        for line in output:
-            for el in line.split():
-                if "JobState" in el:
-                    status = el.split("=")[1]
-        if status == None:
+        """
+        :param pid: Job ID for job
+        """
+        status = self.job_records.get(pid).state
+        if status is None:
             self.log_update("Job Status not found. ErrorCode_mel34")
             return "ErrorCode_mel34"
         else:
@@ -1064,10 +1428,14 @@ class MainWindow(tk.Frame):
 
     def log_update(self, msg):
         """
-        Print message in log window.
+        Print message in log window. May be called from worker threads, in which case
+        the message is handed over to the Tk thread.
         :param msg:
         :return:
         """
+        if threading.current_thread() is not threading.main_thread():
+            return self.executor.post(self.log_update, msg)
+
         time = str(datetime.now().time()).split(".")[0]
         logmsg = f"[{time}] {msg}\n"
         self.log.config(state=tk.NORMAL)
@@ -1076,9 +1444,25 @@ class MainWindow(tk.Frame):
         return
 
     def get_jobinfo(self, pid):
+        """
+        :param pid: Job ID for job
+        :return: str, output of scontrol show jobid, from the job record cache
+        """
+        return self.job_records.get(pid).text
+
+    def fetch_jobinfo(self, pid):
+        """
+        :param pid: str, job ID
+        :return: str, scontrol show jobid output. Empty if scontrol does not know the job
+        """
+        if self.session.agent is not None:
+            try:
+                return format_scontrol(self.session.agent.call("jobinfo", jobid=pid))
+            except AgentError:  # e.g. the job finished long ago
+                return ""
+
         cmd = "scontrol show jobid {}".format(pid)
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-        return stdout.read().decode('ascii')
+        return self.session.run(cmd).stdout
 
     def determine_job_software(self, outputfile):
         """
@@ -1113,12 +1497,9 @@ class MainWindow(tk.Frame):
         """Copy all important files back to the workdir. This can be done if
         there is danger of the job not completing within the timelimit."""
         self.parent.debug("INITIATING BACKUP OF SCRATCH FILES", header=True)
-        pid = self.selected_text.get()
-
-        outputfile = self.locate_output_file(pid)
-        destination = os.path.join(self.master.tmp, os.path.basename(outputfile))
-        self.sftp_client.get(outputfile, destination)
+        self.with_output_file(self.selected_text.get(), self.copy_scratch_files)
 
+    def copy_scratch_files(self, pid, outputfile, destination):
         G, O, M = self.determine_job_software(destination)
 
         scratch = os.path.dirname(outputfile)
@@ -1126,52 +1507,31 @@ class MainWindow(tk.Frame):
         backup_dir = os.path.join(self.get_workdir(pid), f"{jobname}_backup")
         self.log_update(f"Copying files to {backup_dir}")
 
-        # Test if backup dir exists, overwrite if it does
-        if helpers.is_remotedir(self.ssh_client, backup_dir):
-            self.ssh_client.exec_command(f"rm -r {backup_dir}")
-            self.ssh_client.exec_command(f"mkdir {backup_dir}")
-            self.parent.debug("Backup dir existed => overwrite")
-        else:
-            self.ssh_client.exec_command(f"mkdir {backup_dir}")
-            self.parent.debug("Backup dir did not exist.")
-
         if G:
             save_files = [".out", ".chk"]
             self.parent.debug("Copying back Gaussian files")
-            for ext in save_files:
-                self.parent.debug(f"-> {ext} file")
-                src = os.path.join(scratch, jobname+ext)
-                cmd = f"cp {src} {backup_dir}"
-                stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-
-                if stderr:
-                    self.log_update(f"{ext}: stderr: {stderr.read().decode('ascii')}")
-                    self.parent.debug(f"-> stderr: {stderr.read().decode('ascii')}")
-
         elif O:
             save_files = [".out", ".gbw", ".xyz"]
             self.parent.debug("Copying back ORCA files")
-            for ext in save_files:
-                self.parent.debug(f"-> {ext} file")
-                src = os.path.join(scratch, jobname + ext)
-                cmd = f"cp {src} {backup_dir}"
-                stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
-
-                if stderr.read().decode("ascii").strip():
-                    self.log_update(f"{ext}: stderr: {stderr.read().decode('ascii')}")
-                    self.parent.debug(f"-> stderr: {stderr.read().decode('ascii')}")
         else:
             save_files = [".out"]
             self.parent.debug("Copying back MRChem files")
-            for ext in save_files:
-                self.parent.debug(f"-> {ext} file")
-                src = os.path.join(scratch, jobname + ext)
-                cmd = f"cp {src} {backup_dir}"
-                stdin, stdout, stderr = self.ssh_client.exec_command(cmd)
 
-                if stderr:
-                    self.log_update(f"{ext}: stderr: {stderr.read().decode('ascii')}")
-                    self.parent.debug(f"-> stderr: {stderr.read().decode('ascii')}")
+        # Overwrite the backup dir if it exists, and copy the files. All in one round trip.
+        cmds = [f"test -d {backup_dir} && rm -r {backup_dir}", f"mkdir {backup_dir}"]
+        cmds += [f"cp {os.path.join(scratch, jobname+ext)} {backup_dir}" for ext in save_files]
+        results = helpers.run_batch(self.ssh_client, cmds)
+
+        if results[0].exit_code == 0:
+            self.parent.debug("Backup dir existed => overwrite")
+        else:
+            self.parent.debug("Backup dir did not exist.")
+
+        for ext, result in zip(save_files, results[2:]):
+            self.parent.debug(f"-> {ext} file")
+            if result.stderr.strip():
+                self.log_update(f"{ext}: stderr: {result.stderr}")
+                self.parent.debug(f"-> stderr: {result.stderr}")
 
     def update_current_file(self):
         if messagebox.askyesno("Update file contents",
@@ -1180,9 +1540,7 @@ class MainWindow(tk.Frame):
             cmds = [f"echo '{line}' >> {self.current_file.get()}" for line in contents]
             rm = f"rm {self.current_file.get()}"
 
-            self.ssh_client.exec_command(rm)
-            for cmd in cmds:
-                self.ssh_client.exec_command(cmd)
+            helpers.run_batch(self.ssh_client, [rm] + cmds)
 
             self.log_update(f"Updated {self.current_file.get()}")
 
@@ -1200,21 +1558,18 @@ class MainWindow(tk.Frame):
         cmd_mkdir = f"mkdir -p {destination}"
         cmd_copy = f"cp {source}/* {destination}/"
 
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd_dush)
-        dush = stdout.read().decode("ascii").strip()
+        dush, touch, mkdir, copy = helpers.run_batch(self.ssh_client, [cmd_dush, cmd_touch, cmd_mkdir, cmd_copy])
+        dush = dush.stdout.strip()
         self.log_update(f"Orbital size: {dush}")
 
         self.log_update("Touching checkpoint pointer:")
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd_touch)
-        self.log_update(f"stderr: {stderr.read().decode('ascii').strip()}")
+        self.log_update(f"stderr: {touch.stderr.strip()}")
 
         self.log_update("Creating CHK directory")
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd_mkdir)
-        self.log_update(f"stderr: {stderr.read().decode('ascii').strip()}")
+        self.log_update(f"stderr: {mkdir.stderr.strip()}")
 
         self.log_update("Copying orbital checkpoints:")
-        stdin, stdout, stderr = self.ssh_client.exec_command(cmd_copy)
-        self.log_update(f"stderr: {stderr.read().decode('ascii').strip()}")
+        self.log_update(f"stderr: {copy.stderr.strip()}")
         self.log_update("Checkpointing done!")
 
         # Make OSX notification
@@ -146,6 +146,11 @@ class Preferences(tk.Toplevel):
         self.entry_monitor_q_update_freq.grid(row=12, column=1, sticky=tk.W)
         self.entry_monitor_q_update_freq.insert(0, self.master.queue_monitor_update_frequency.get())
 
+        tk.Label(self.frame, text="Minimum (ms): ").grid(row=12, column=2, sticky=tk.E)
+        self.entry_monitor_q_min_update_freq = tk.Entry(self.frame)
+        self.entry_monitor_q_min_update_freq.grid(row=12, column=3, sticky=tk.W)
+        self.entry_monitor_q_min_update_freq.insert(0, self.master.queue_monitor_min_update_frequency.get())
+
         # ROW 13
         tk.Label(self.frame, text="Highlight these users in CPU usage: (space sep)").grid(row=13, column=0, sticky=tk.E)
         self.entry_highlight_users = tk.Entry(self.frame)
@@ -165,6 +170,21 @@ class Preferences(tk.Toplevel):
                        text="Skip to the end when opening output files",
                        variable=self.master.skip_end_output).grid(row=16, column=0, sticky=tk.W)
 
+        # ROW 17
+        tk.Checkbutton(self.frame,
+                       text="Send commands through one persistent remote shell",
+                       variable=self.master.persistent_shell).grid(row=17, column=0, sticky=tk.W)
+
+        # ROW 18
+        tk.Checkbutton(self.frame,
+                       text="Use the remote agent (requires Python on the cluster)",
+                       variable=self.master.remote_agent).grid(row=18, column=0, sticky=tk.W)
+
+        # ROW 19
+        tk.Checkbutton(self.frame,
+                       text="Record CPU usage in the background, and show trends",
+                       variable=self.master.cpu_usage_history).grid(row=19, column=0, sticky=tk.W)
+
         # Buttons on last row
         tk.Button(self.frame, text="Apply", command=self.get_new_settings, fg="green").grid(row=95, column=0, sticky=tk.W)
         tk.Button(self.frame, text="ColorPicker", command=self.colorpicker2).grid(row=96, column=0, sticky=tk.W)
@@ -179,11 +199,15 @@ class Preferences(tk.Toplevel):
         self.master.current_settings["background_color"] = self.entry_background_color.get().strip()
         self.master.current_settings["job_history_length"] = self.master.job_history_length.get()
         self.master.current_settings["queue_monitor_update_frequency"] = self.entry_monitor_q_update_freq.get()
+        self.master.current_settings["queue_monitor_min_update_frequency"] = self.entry_monitor_q_min_update_freq.get()
         self.master.current_settings["cpu_usage_highlight_users"] = self.entry_highlight_users.get()
         self.master.current_settings["visualizer_mode"] = self.master.visualizer_mode.get()
         self.master.current_settings["check_for_updates"] = "Yes" if self.master.check_for_updates.get() else "No"
         self.master.current_settings["do_debug"] = self.master.do_debug.get()
         self.master.current_settings["skip_end_output"] = self.master.skip_end_output.get()
+        self.master.current_settings["persistent_shell"] = self.master.persistent_shell.get()
+        self.master.current_settings["remote_agent"] = self.master.remote_agent.get()
+        self.master.current_settings["cpu_usage_history"] = self.master.cpu_usage_history.get()
 
         self.master.current_settings["fonts"]["main"]["size"] = self.master.fontsize_main.get()
         self.master.current_settings["fonts"]["main"]["family"] = self.master.fontfam_main.get()
@@ -203,6 +227,8 @@ class Preferences(tk.Toplevel):
         # Update widgets
         self.master.set_system_variables()
         self.master.set_fonts()
+        self.parent.session.use_persistent_shell(self.master.persistent_shell.get())
+        self.parent.start_remote_agent()
         self.update_all_widgets()
 
         # Write current settings to file if not in preview mode
@@ -239,6 +265,7 @@ class Preferences(tk.Toplevel):
             grid.destroy()
 
         # And finally we place the new widgets, and print the queue
+        self.parent.check_output_extensions()
         self.parent.place_widgets()
         self.parent.print_q()
 
@@ -13,6 +13,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from mainwindow import MainWindow
 from login import Login
+from session import SessionPool
 
 
 ####################
@@ -28,6 +29,10 @@ class QueueGui(tk.Tk):
         tk.Tk.__init__(self)
         self.name = "QueueGui3_DEV" if DEV else "QueueGui3"
         self.do_debug = tk.BooleanVar()
+        # Worker threads print debug output too, and must not read Tk variables.
+        # The flag is copied whenever it is set, which happens on the Tk thread.
+        self.debug_enabled = False
+        self.do_debug.trace_add("write", lambda *args: setattr(self, "debug_enabled", self.do_debug.get()))
         self.rootdir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
         self.platform = sys.platform
 
@@ -83,6 +88,7 @@ class QueueGui(tk.Tk):
         self.background_color = tk.StringVar()
         self.job_history_length = tk.IntVar()
         self.queue_monitor_update_frequency = tk.IntVar()
+        self.queue_monitor_min_update_frequency = tk.IntVar()
         self.cpu_usage_highlight_users = tk.StringVar()
         self.fontsize_main = tk.IntVar()
         self.fontsize_q = tk.IntVar()
@@ -99,6 +105,9 @@ class QueueGui(tk.Tk):
         self.extensions_inputfiles = tk.StringVar()
         self.extensions_outputfiles = tk.StringVar()
         self.skip_end_output = tk.BooleanVar()
+        self.persistent_shell = tk.BooleanVar()
+        self.remote_agent = tk.BooleanVar()
+        self.cpu_usage_history = tk.BooleanVar()
 
         # Define default settings
         self.default_settings = {
@@ -106,10 +115,14 @@ class QueueGui(tk.Tk):
             "job_history_length": 14,
             "check_for_updates": "Yes" if self.check_for_updates.get() else "No",
             "queue_monitor_update_frequency": 4000,
+            "queue_monitor_min_update_frequency": 1000,
             "cpu_usage_highlight_users": "",
             "visualizer_mode": self.visualizer_mode.get(),
             "do_debug": False,
             "skip_end_output": False,
+            "persistent_shell": False,
+            "remote_agent": False,
+            "cpu_usage_history": False,
 
             "fonts": {
                 "main": {"size": 13, "family": "Chalkboard SE"},
@@ -129,6 +142,12 @@ class QueueGui(tk.Tk):
             }
         }
 
+        # Authenticated sessions to all clusters visited in this run
+        self.session_pool = SessionPool(keepalive=30, idle_timeout=3600)
+        self.session_expiry_interval = 60000  # ms
+        # CPU usage history of each cluster visited in this run, kept across logins and cluster switches
+        self.cpu_histories = {}
+
         # Set up a temporary directory for storing files
         self.tmp = tempfile.mkdtemp()
         print(f"Temporary files will be stored in:\n{self.tmp}")
@@ -148,9 +167,11 @@ class QueueGui(tk.Tk):
         if self.check_for_updates.get():
             self.update_checker()
 
+        self.expire_sessions()
+
     def show_login(self):
         self.login_window.grid(row=0, column=0)
-        if not self.startup:
+        if not self.startup and self.main_window.winfo_exists():
             self.main_window.grid_forget()
 
     def show_main(self):
@@ -158,6 +179,20 @@ class QueueGui(tk.Tk):
         self.login_window.grid_forget()
         self.main_window.grid(row=0, column=0)
 
+    def expire_sessions(self):
+        """
+        Close idle cluster sessions, except the one currently in use. Runs periodically.
+        :return:
+        """
+        current = self.login_window.session if self.main_window_is_shown() else None
+        n = self.session_pool.expire(keep=current)
+        if n:
+            self.debug(f"Closed {n} idle session(s)")
+        self.after(self.session_expiry_interval, self.expire_sessions)
+
+    def main_window_is_shown(self):
+        return hasattr(self, "main_window") and self.main_window.winfo_exists() and self.main_window.winfo_ismapped()
+
     def load_settings(self):
         """
         Attempt to load the settings file from default path, and assign settings to variable.
@@ -194,10 +229,14 @@ class QueueGui(tk.Tk):
         self.background_color.set(self.current_settings["background_color"])
         self.job_history_length.set(self.current_settings["job_history_length"])
         self.queue_monitor_update_frequency.set(self.current_settings["queue_monitor_update_frequency"])
+        self.queue_monitor_min_update_frequency.set(self.current_settings.get("queue_monitor_min_update_frequency", self.default_settings["queue_monitor_min_update_frequency"]))
         self.cpu_usage_highlight_users.set(self.current_settings["cpu_usage_highlight_users"])
         self.visualizer_mode.set(self.current_settings["visualizer_mode"])
         self.do_debug.set(self.current_settings["do_debug"])
         self.skip_end_output.set(self.current_settings["skip_end_output"])
+        self.persistent_shell.set(self.current_settings.get("persistent_shell", self.default_settings["persistent_shell"]))
+        self.remote_agent.set(self.current_settings.get("remote_agent", self.default_settings["remote_agent"]))
+        self.cpu_usage_history.set(self.current_settings.get("cpu_usage_history", self.default_settings["cpu_usage_history"]))
 
         if self.current_settings["check_for_updates"] == "Yes":
             self.check_for_updates.set(True)
@@ -282,7 +321,7 @@ class QueueGui(tk.Tk):
     def debug(self, s="", header=False):
         if header:
             print("------------------------------------")
-        if s != "" and self.do_debug.get():
+        if s != "" and self.debug_enabled:
             print(s)
 
 
@@ -298,5 +337,7 @@ if __name__ == "__main__":
 
     app.mainloop()
 
+    app.session_pool.close_all()
+
     print(f"Removing temporary directory:\n{app.tmp}")
     shutil.rmtree(app.tmp)
\ No newline at end of file
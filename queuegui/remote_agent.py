@@ -0,0 +1,199 @@
+"""
+QueueGui remote agent.
+
+This script is uploaded to the login node and started over SSH by agent.AgentClient.
+It must only depend on the Python standard library, and must stay compatible with the
+python3 that ships with the clusters' operating system.
+
+Protocol: one JSON object per line on stdin and stdout.
+    request:  {"id": 1, "method": "stat", "params": {"paths": ["/some/file"]}}
+    response: {"id": 1, "result": ...}  or  {"id": 1, "error": "message"}
+
+Streaming methods are generators. Each value other than None that they yield is sent as
+an event with the ID of the request, {"id": 1, "event": ...}, until the stream ends with
+a normal response. A stream is stopped with {"method": "cancel", "params": {"rid": 1}}.
+
+Each request is served in its own thread, so slow requests do not hold up fast ones.
+"""
+import base64
+import inspect
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+SEP = "\x1f"  # ASCII unit separator, does not occur in job names
+QUEUE_FIELDS = [("jobid", "%i"), ("name", "%j"), ("partition", "%P"), ("state", "%T"), ("user", "%u"),
+                ("time", "%M"), ("timelimit", "%l"), ("nodes", "%D"), ("cpus", "%C"), ("reason", "%R")]
+
+write_lock = threading.Lock()
+streams = {}  # request ID: threading.Event, set to stop the stream
+
+
+def run(cmd):
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode != 0:
+        raise RuntimeError(err.decode("utf-8", "replace").strip() or "{} failed".format(cmd[0]))
+    return out.decode("utf-8", "replace")
+
+
+def ping():
+    return {"pid": os.getpid(), "python": sys.version.split()[0]}
+
+
+def queue(user=None, states=None):
+    cmd = ["squeue", "-h", "-S", "i", "-o", SEP.join(fmt for _, fmt in QUEUE_FIELDS)]
+    if user and user != "all":
+        cmd += ["-u", user]
+    if states:
+        cmd += ["-t", states]
+    jobs = []
+    for line in run(cmd).splitlines():
+        values = line.split(SEP)
+        if len(values) == len(QUEUE_FIELDS):
+            jobs.append(dict(zip([name for name, _ in QUEUE_FIELDS], values)))
+    return jobs
+
+
+def watch_queue(user=None, interval=2.0, heartbeat=60.0):
+    """
+    Stream the queue of a user. The first event holds all jobs, the following events only the
+    jobs that appeared or changed, and the IDs of the jobs that left the queue. Elapsed times
+    alone do not count as changes, so an idle queue sends nothing but a heartbeat every
+    heartbeat seconds, with the elapsed times of all jobs, which the client advances in between.
+    """
+    def key(job):
+        return dict((field, value) for field, value in job.items() if field != "time")
+
+    previous = None
+    sent = time.time()
+    while True:
+        current = dict((job["jobid"], job) for job in queue(user, "all"))
+        if previous is None:
+            event = {"full": True, "jobs": list(current.values()), "removed": [], "times": {}}
+        else:
+            changed = [job for jobid, job in current.items()
+                       if jobid not in previous or key(previous[jobid]) != key(job)]
+            removed = [jobid for jobid in previous if jobid not in current]
+            event = None  # not sent, but gives serve() the chance to stop a cancelled stream
+            if changed or removed:
+                event = {"full": False, "jobs": changed, "removed": removed, "times": {}}
+            elif time.time() - sent >= heartbeat:
+                event = {"full": False, "jobs": [], "removed": [],
+                         "times": dict((jobid, job["time"]) for jobid, job in current.items())}
+        if event is not None:
+            sent = time.time()
+        yield event
+        previous = current
+        time.sleep(interval)
+
+
+def cpu_usage():
+    """Running and pending CPUs per user and partition."""
+    cmd = ["squeue", "-h", "-t", "R,PD", "-o", SEP.join(["%u", "%P", "%C", "%t"])]
+    sums = {}
+    for line in run(cmd).splitlines():
+        values = line.split(SEP)
+        if len(values) != 4 or not values[2].isdigit():
+            continue
+        cpus = sums.setdefault((values[0], values[1]), [0, 0])
+        cpus[0 if values[3] == "R" else 1] += int(values[2])
+    return [{"user": user, "partition": partition, "running": running, "pending": pending}
+            for (user, partition), (running, pending) in sums.items()]
+
+
+def cancel(rid):
+    stop = streams.get(rid)
+    if stop is not None:
+        stop.set()
+    return stop is not None
+
+
+def jobinfo(jobid):
+    """All fields of scontrol show job, as a dict. Values may contain spaces. Fails for unknown jobs."""
+    out = run(["scontrol", "-o", "show", "job", str(jobid)]).strip()
+    return dict(re.findall(r"(\w[\w:/]*)=(.*?)(?= \w[\w:/]*=|$)", out))
+
+
+def stat(paths):
+    result = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            result.append({"path": path, "exists": True, "size": st.st_size, "mtime": st.st_mtime,
+                           "is_dir": os.path.isdir(path)})
+        except OSError:
+            result.append({"path": path, "exists": False})
+    return result
+
+
+def scandir(path, stat=True):
+    if not stat:  # names only, which is much cheaper for large directories
+        return {"path": path, "mtime": os.stat(path).st_mtime, "entries": [{"name": name} for name in os.listdir(path)]}
+    entries = []
+    for name in os.listdir(path):
+        try:
+            st = os.stat(os.path.join(path, name))
+            entries.append({"name": name, "mtime": st.st_mtime, "is_dir": os.path.isdir(os.path.join(path, name))})
+        except OSError:
+            continue
+    return {"path": path, "mtime": os.stat(path).st_mtime, "entries": entries}
+
+
+def read(path, offset=0, length=None):
+    """Part of a file. The data is base64 encoded, so the bytes arrive unchanged."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        data = f.read() if length is None else f.read(length)
+    return {"path": path, "size": size, "offset": offset, "data": base64.b64encode(data).decode("ascii")}
+
+
+METHODS = {f.__name__: f for f in [ping, queue, watch_queue, cpu_usage, cancel, jobinfo, stat, scandir, read]}
+
+
+def respond(response):
+    line = json.dumps(response) + "\n"
+    with write_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def serve(request):
+    try:
+        method = METHODS[request["method"]]
+        if not inspect.isgeneratorfunction(method):
+            respond({"id": request["id"], "result": method(**request.get("params", {}))})
+            return
+
+        stop = streams[request["id"]] = threading.Event()
+        try:
+            for event in method(**request.get("params", {})):
+                if stop.is_set():
+                    break
+                if event is not None:
+                    respond({"id": request["id"], "event": event})
+        finally:
+            streams.pop(request["id"], None)
+        respond({"id": request["id"], "result": None})
+    except Exception as e:
+        respond({"id": request.get("id"), "error": "{}: {}".format(type(e).__name__, e)})
+
+
+def main():
+    for line in iter(sys.stdin.readline, ""):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        t = threading.Thread(target=serve, args=(request,))
+        t.daemon = True
+        t.start()
+
+
+if __name__ == "__main__":
+    main()
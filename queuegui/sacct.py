@@ -0,0 +1,97 @@
+from collections import namedtuple
+
+import slurm
+
+
+# Fields fetched from sacct, in order. Raw durations are in seconds and need no parsing.
+# The job name is the only free-form field, so it is fetched last and may contain the delimiter.
+SACCT_FIELDS = ["JobID", "User", "Partition", "State", "Timelimit", "NNodes", "NCPUS", "CPUTimeRAW", "ElapsedRaw",
+                "Start", "End", "MaxRSS", "JobName"]
+
+# A job with its steps folded in
+SacctJob = namedtuple("SacctJob", ["jobid", "user", "partition", "state", "timelimit", "nnodes", "ncpus", "cputime",
+                                   "elapsed", "start", "end", "maxrss", "name", "steps"])
+
+
+def sacct_command(user, starttime):
+    """
+    :param user: str
+    :param starttime: int, seconds since the epoch
+    :return: str, sacct command whose output can be parsed by parse_sacct
+    """
+    return (f"sacct -u {user} --parsable2 --noheader --starttime {slurm.format_timestamp(starttime)} "
+            f"--format={','.join(SACCT_FIELDS)}")
+
+
+def to_int(value):
+    return int(value) if value.isdigit() else 0
+
+
+def parse_sacct(output):
+    """
+    Parse the output of sacct_command into typed records. Job steps (e.g. 1234.batch or 1234.0)
+    are folded into their job: they are counted, and the largest MaxRSS of the steps is kept,
+    as sacct only reports memory use for steps.
+
+    :param output: str
+    :return: list of SacctJob, in the order sacct printed them
+    """
+    jobs = {}
+    for line in output.splitlines():
+        values = line.split("|", len(SACCT_FIELDS) - 1)
+        if len(values) != len(SACCT_FIELDS):
+            continue
+        jobid, user, partition, state, timelimit, nnodes, ncpus, cputime, elapsed, start, end, maxrss, name = values
+
+        parent, _, step = jobid.partition(".")
+        if step:
+            job = jobs.get(parent)
+            if job is not None:
+                jobs[parent] = job._replace(maxrss=max(job.maxrss, slurm.parse_size(maxrss)), steps=job.steps + 1)
+            continue
+
+        jobs[jobid] = SacctJob(jobid=jobid,
+                               user=user,
+                               partition=partition,
+                               state=state.split()[0] if state else "",  # e.g. CANCELLED by 1234
+                               timelimit=slurm.parse_duration(timelimit),
+                               nnodes=to_int(nnodes),
+                               ncpus=to_int(ncpus),
+                               cputime=to_int(cputime),
+                               elapsed=to_int(elapsed),
+                               start=slurm.parse_timestamp(start),
+                               end=slurm.parse_timestamp(end),
+                               maxrss=slurm.parse_size(maxrss),
+                               name=name,
+                               steps=0)
+    return list(jobs.values())
+
+
+# Columns of the history view: (header, field, formatter)
+HISTORY_COLUMNS = [("JobName", "name", str),
+                   ("JobID", "jobid", str),
+                   ("User", "user", str),
+                   ("Partition", "partition", str),
+                   ("State", "state", str),
+                   ("Timelimit", "timelimit", slurm.format_duration),
+                   ("NNodes", "nnodes", str),
+                   ("NCPUS", "ncpus", str),
+                   ("CPUTime", "cputime", slurm.format_duration),
+                   ("Elapsed", "elapsed", slurm.format_duration),
+                   ("MaxRSS", "maxrss", slurm.format_size),
+                   ("Start", "start", slurm.format_timestamp),
+                   ("End", "end", slurm.format_timestamp)]
+
+
+def format_history(jobs):
+    """
+    Format jobs as right-aligned columns, like sacct prints them.
+
+    :param jobs: list of SacctJob
+    :return: tuple, (header line, list of job lines)
+    """
+    rows = [[header for header, _, _ in HISTORY_COLUMNS]]
+    rows += [[fmt(getattr(job, field)) for _, field, fmt in HISTORY_COLUMNS] for job in jobs]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(HISTORY_COLUMNS))]
+    lines = [" ".join(value.rjust(w) for value, w in zip(row, widths)) for row in rows]
+    return lines[0], lines[1:]
@@ -0,0 +1,104 @@
+import weakref
+
+
+class PollScheduler:
+    def __init__(self, interval, minimum=1000, backoff=2.0, max_factor=16):
+        """
+        Decide how long to wait before the next queue poll. Polls are spread out
+        exponentially while nothing happens and nobody is looking, and tightened to the
+        minimum right after a job changed state or the user killed or submitted jobs.
+
+        :param interval: int, normal interval in ms
+        :param minimum: int, shortest interval in ms
+        :param backoff: float, factor by which the interval grows per idle poll
+        :param max_factor: float, the interval never exceeds interval * max_factor
+        """
+        self.interval = interval
+        self.minimum = minimum
+        self.backoff = backoff
+        self.max_factor = max_factor
+
+        self.current = interval
+        self._burst = False
+
+    def __repr__(self):
+        return f"<PollScheduler(current={self.current}, interval={self.interval}, minimum={self.minimum})>"
+
+    def burst(self):
+        """
+        Make the next poll come as soon as allowed, e.g. after the user killed a job.
+        """
+        self._burst = True
+
+    def next(self, changed=False, focused=True):
+        """
+        :param changed: bool, whether the last poll saw jobs change state
+        :param focused: bool, whether the application has focus
+        :return: int, ms until the next poll
+        """
+        if changed or self._burst:
+            self.current = self.minimum
+            self._burst = False
+        elif not focused:
+            self.current = min(self.current * self.backoff, self.interval * self.max_factor)
+        elif self.current < self.interval:
+            # Relax gradually after a burst, in case more jobs are about to change
+            self.current = min(self.current * self.backoff, self.interval)
+        else:
+            self.current = self.interval
+
+        self.current = max(self.current, self.minimum)
+        return int(self.current)
+
+
+class TimerRegistry:
+    # Every registry, so the periodic tasks of all windows can be counted
+    registries = weakref.WeakSet()
+
+    def __init__(self, widget):
+        """
+        Keep track of the periodic tasks of a widget, which re-arm themselves with after().
+        Timers are named, so re-arming replaces the previous timer instead of adding a
+        duplicate, and all of them can be cancelled when the widget is destroyed.
+
+        :param widget: Tk widget whose after() is used
+        """
+        self.widget = widget
+        self._timers = {}
+        TimerRegistry.registries.add(self)
+
+    def __repr__(self):
+        return f"<TimerRegistry({', '.join(self._timers)})>"
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, name):
+        return name in self._timers
+
+    @classmethod
+    def live(cls):
+        """
+        :return: int, number of scheduled timers in all registries
+        """
+        return sum(len(registry) for registry in cls.registries)
+
+    def after(self, name, ms, func, *args):
+        """
+        Call func(*args) after ms milliseconds, replacing any timer with the same name.
+        """
+        self.cancel(name)
+        self._timers[name] = self.widget.after(ms, self._fire, name, func, *args)
+
+    def _fire(self, name, func, *args):
+        self._timers.pop(name, None)
+        func(*args)
+
+    def cancel(self, name):
+        after_id = self._timers.pop(name, None)
+        if after_id is not None:
+            self.widget.after_cancel(after_id)
+
+    def cancel_all(self):
+        for name in list(self._timers):
+            self.cancel(name)
@@ -0,0 +1,80 @@
+import re
+import threading
+
+# Scratch directories are named after their job, and end with the job ID, which is
+# ArrayJobId_ArrayTaskId for array tasks
+JOBID_PATTERN = re.compile(r"\d+(?:_\d+)?$")
+
+
+def jobid_keys(name):
+    """
+    :param name: str, name of a scratch directory
+    :return: list of str, the job IDs the name may end with. The name h2o.1234_5 may belong to
+             array task 1234_5, or to job 5 in a directory named after something else
+    """
+    match = JOBID_PATTERN.search(name)
+    if match is None:
+        return []
+    jobid = match.group(0)
+    return [jobid, jobid.rpartition("_")[2]] if "_" in jobid else [jobid]
+
+
+class ScratchIndex:
+    def __init__(self, path, listdir, mtime):
+        """
+        Index of the scratch directories under a scratch root, by job ID. The root is only listed
+        again when its modification time changes, which happens whenever a directory is created
+        or removed in it, and then only the new directories are indexed.
+
+        :param path: str, scratch root
+        :param listdir: callable, takes a path and returns the names in it
+        :param mtime: callable, takes a path and returns its modification time
+        """
+        self.path = path
+        self.listdir = listdir
+        self.mtime = mtime
+
+        self.dirs = {}  # job ID to directory name
+        self.names = set()
+        self.timestamp = None  # mtime of the root when it was last listed
+        self.listings = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<ScratchIndex({self.path}, dirs={len(self.dirs)})>"
+
+    def __len__(self):
+        return len(self.dirs)
+
+    def refresh(self):
+        """
+        List the scratch root again if it changed since the last listing. May block on remote calls,
+        so only call this from a worker thread.
+        :return: bool, whether the root was listed
+        """
+        with self._lock:
+            mtime = self.mtime(self.path)
+            if mtime == self.timestamp:
+                return False
+
+            names = set(self.listdir(self.path))
+            for name in self.names - names:
+                for jobid in jobid_keys(name):
+                    if self.dirs.get(jobid) == name:
+                        del self.dirs[jobid]
+            for name in sorted(names - self.names):
+                for jobid in jobid_keys(name):
+                    self.dirs.setdefault(jobid, name)
+
+            self.names = names
+            self.timestamp = mtime
+            self.listings += 1
+            return True
+
+    def lookup(self, jobid):
+        """
+        :param jobid: str
+        :return: str, name of the scratch directory of the job. None if it has none
+        """
+        self.refresh()
+        return self.dirs.get(str(jobid).strip())
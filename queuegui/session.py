@@ -0,0 +1,205 @@
+import threading
+import time
+import paramiko as pmk
+
+from helpers import BatchResult
+from shell import RemoteShell
+from agent import AgentClient
+
+
+class Session:
+    def __init__(self, hostname, username, password, port=22):
+        """
+        One authenticated SSH transport to a remote cluster. Both exec channels and the
+        SFTP subsystem are opened on this transport, so a login costs a single key exchange
+        and a single password authentication.
+
+        :param hostname: str, hostname of the cluster login node
+        :param username: str
+        :param password: str
+        :param port: int
+        """
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.port = port
+
+        self.transport = None
+        self._sftp = None
+        self.shell = None  # RemoteShell, when the persistent shell mode is enabled
+        self.agent = None  # AgentClient, when the remote agent is enabled and running
+        self.last_used = time.time()
+
+    def __repr__(self):
+        return f"<Session({self.username}@{self.hostname})>"
+
+    def connect(self, keepalive=0):
+        """
+        Open the transport and authenticate with password.
+        Raises paramiko.ssh_exception.AuthenticationException on wrong credentials.
+        :param keepalive: int, seconds between keepalive packets. 0 disables keepalives.
+        :return: self
+        """
+        self.transport = pmk.Transport((self.hostname, self.port))
+        try:
+            self.transport.connect(username=self.username, password=self.password)
+        except Exception:
+            self.transport.close()
+            self.transport = None
+            raise
+        self.transport.set_keepalive(keepalive)
+        self.last_used = time.time()
+        return self
+
+    def is_active(self):
+        return self.transport is not None and self.transport.is_active()
+
+    def exec_command(self, command, bufsize=-1, timeout=None):
+        """
+        Execute a command on a new channel of the shared transport.
+        Drop-in replacement for paramiko.SSHClient.exec_command.
+
+        :param command: str, shell command to execute
+        :param bufsize: int, buffering of the returned file objects
+        :param timeout: float, channel timeout in seconds
+        :return: tuple, (stdin, stdout, stderr)
+        """
+        self.last_used = time.time()
+        channel = self.transport.open_session(timeout=timeout)
+        channel.settimeout(timeout)
+        channel.exec_command(command)
+        stdin = channel.makefile_stdin("wb", bufsize)
+        stdout = channel.makefile("r", bufsize)
+        stderr = channel.makefile_stderr("r", bufsize)
+        return stdin, stdout, stderr
+
+    def run(self, command):
+        """
+        Run a command and wait for it to finish. Goes through the persistent shell if that
+        mode is enabled, and through a new exec channel otherwise.
+
+        :param command: str, shell command to execute
+        :return: helpers.BatchResult(stdout, stderr, exit_code)
+        """
+        if self.shell is not None:
+            self.last_used = time.time()
+            return self.shell.run(command)
+
+        stdin, stdout, stderr = self.exec_command(command)
+        out = stdout.read().decode("utf-8", errors="replace")
+        err = stderr.read().decode("utf-8", errors="replace")
+        return BatchResult(out, err, stdout.channel.recv_exit_status())
+
+    def use_persistent_shell(self, enabled):
+        """
+        Turn the persistent shell mode on or off. In this mode, run() multiplexes commands
+        over one long-lived bash channel instead of opening a channel per command.
+        :param enabled: bool
+        """
+        if enabled and self.shell is None:
+            self.shell = RemoteShell(self)
+        elif not enabled and self.shell is not None:
+            self.shell.close()
+            self.shell = None
+
+    def use_remote_agent(self, enabled):
+        """
+        Start or stop the remote agent. If the agent cannot be started (e.g. because there
+        is no Python on the cluster), self.agent stays None and callers use shell commands.
+        :param enabled: bool
+        :return: bool, whether the agent is running
+        """
+        if enabled and self.agent is None:
+            agent = AgentClient(self)
+            if agent.start():
+                self.agent = agent
+        elif not enabled and self.agent is not None:
+            self.agent.close()
+            self.agent = None
+        return self.agent is not None
+
+    @property
+    def sftp(self):
+        """
+        SFTP client on the shared transport. Opened on first use and reused thereafter.
+        :return: paramiko.SFTPClient
+        """
+        self.last_used = time.time()
+        if self._sftp is None or self._sftp.get_channel().closed:
+            self._sftp = pmk.SFTPClient.from_transport(self.transport)
+        return self._sftp
+
+    def close(self):
+        if self.agent is not None:
+            self.agent.close()
+            self.agent = None
+        if self.shell is not None:
+            self.shell.close()
+            self.shell = None
+        if self._sftp is not None:
+            self._sftp.close()
+            self._sftp = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+
+class SessionPool:
+    def __init__(self, keepalive=30, idle_timeout=3600):
+        """
+        Authenticated sessions to every cluster visited during this run, so that switching
+        back to a cluster reuses the warm transport and SFTP channel instead of logging in again.
+
+        :param keepalive: int, seconds between keepalive packets on each transport
+        :param idle_timeout: int, sessions unused for this many seconds are closed by expire()
+        """
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, hostname, username, password):
+        """
+        Return the live session for this host and user, or log in if there is none.
+        Raises paramiko.ssh_exception.AuthenticationException on wrong credentials.
+        :return: Session
+        """
+        key = (hostname, username)
+        with self._lock:
+            session = self.sessions.get(key)
+            if session is not None and session.is_active() and session.password == password:
+                session.last_used = time.time()
+                return session
+
+            if session is not None:
+                session.close()
+                del self.sessions[key]
+
+            session = Session(hostname, username, password).connect(keepalive=self.keepalive)
+            self.sessions[key] = session
+            return session
+
+    def expire(self, keep=None):
+        """
+        Close sessions that have been idle for longer than idle_timeout, and sessions
+        whose transport has died.
+        :param keep: Session, never expire this one (e.g. the session currently shown)
+        :return: int, number of closed sessions
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, session in self.sessions.items()
+                       if session is not keep and
+                       (not session.is_active() or now - session.last_used > self.idle_timeout)]
+            for key in expired:
+                self.sessions.pop(key).close()
+        return len(expired)
+
+    def close_all(self):
+        with self._lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
@@ -0,0 +1,204 @@
+import shlex
+import threading
+import uuid
+
+from helpers import BatchResult
+
+
+class ShellError(Exception):
+    pass
+
+
+class ShellRequest:
+    def __init__(self, rid, command):
+        """
+        A command sent to a RemoteShell, waiting for its framed response.
+
+        :param rid: int, request ID, echoed back in the response frame
+        :param command: str, shell command
+        """
+        self.rid = rid
+        self.command = command
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def __repr__(self):
+        return f"<ShellRequest(rid={self.rid}, command={self.command!r})>"
+
+    def done(self):
+        return self._done.is_set()
+
+    def set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def set_error(self, error):
+        self._error = error
+        self._done.set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the response.
+        Raises ShellError if the shell died, or TimeoutError if no response arrived in time.
+        :return: BatchResult
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"No response from remote shell within {timeout} s: {self.command}")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class RemoteShell:
+    def __init__(self, session, timeout=60):
+        """
+        One long-lived bash process on the login node, reached through a single channel
+        of the session's transport. Commands are written to the shell as soon as they are
+        submitted, so several can be in flight at once. The shell runs them in order and
+        answers each with a frame:
+
+            <sentinel> <request id> <exit code> <stdout bytes> <stderr bytes>\\n<stdout><stderr>
+
+        If the shell dies or a request stalls for longer than timeout, the shell is torn
+        down and a new one is started on the next request.
+
+        :param session: session.Session
+        :param timeout: float, seconds to wait for a response before the shell is considered stalled
+        """
+        self.session = session
+        self.timeout = timeout
+        self.restarts = 0
+
+        self._lock = threading.Lock()
+        self._channel = None
+        self._reader = None
+        self._pending = {}
+        self._next_rid = 0
+        self._sentinel = None
+
+    def __repr__(self):
+        return f"<RemoteShell({self.session}, alive={self.is_alive()})>"
+
+    def is_alive(self):
+        return self._channel is not None and not self._channel.closed and self._reader.is_alive()
+
+    def _start(self):
+        """
+        Start bash and define the framing function. Must be called with the lock held.
+        """
+        self._sentinel = f"__QUEUEGUI_{uuid.uuid4().hex}__"
+        self._channel = self.session.transport.open_session()
+        self._channel.exec_command("bash --noprofile --norc -s")
+
+        # $( ...; printf x) keeps trailing newlines, which command substitution would strip.
+        # The lengths are computed in the C locale, so that they count bytes, not characters.
+        self._channel.sendall((
+            "__qg() {\n"
+            "  local o e rc err\n"
+            "  e=$(mktemp)\n"
+            "  o=$( (eval \"$2\") 2>\"$e\" </dev/null; rc=$?; printf x; exit $rc)\n"
+            "  rc=$?\n"
+            "  o=${o%x}\n"
+            "  err=$(cat \"$e\"; printf x)\n"
+            "  err=${err%x}\n"
+            "  rm -f \"$e\"\n"
+            "  local LC_ALL=C\n"
+            f"  printf '{self._sentinel} %s %d %d %d\\n%s%s' \"$1\" \"$rc\" \"${{#o}}\" \"${{#err}}\" \"$o\" \"$err\"\n"
+            "}\n"
+        ).encode("utf-8"))
+
+        self._reader = threading.Thread(target=self._read, args=(self._channel, self._sentinel), daemon=True)
+        self._reader.start()
+
+    def _read(self, channel, sentinel):
+        """
+        Read response frames and hand them to the waiting requests. Runs in its own thread.
+        """
+        buf = b""
+        header = sentinel.encode("utf-8") + b" "
+
+        def fill(n):
+            nonlocal buf
+            while len(buf) < n:
+                chunk = channel.recv(65536)
+                if not chunk:
+                    raise EOFError
+                buf += chunk
+
+        try:
+            while True:
+                while b"\n" not in buf:
+                    fill(len(buf) + 1)
+                line, buf = buf.split(b"\n", 1)
+                if not line.startswith(header):
+                    continue  # stray output, e.g. from a background process
+                rid, rc, nout, nerr = map(int, line[len(header):].split())
+                fill(nout + nerr)
+                out, err, buf = buf[:nout], buf[nout:nout + nerr], buf[nout + nerr:]
+
+                with self._lock:
+                    request = self._pending.pop(rid, None)
+                if request is not None:
+                    request.set_result(BatchResult(out.decode("utf-8", errors="replace"),
+                                                   err.decode("utf-8", errors="replace"),
+                                                   rc))
+        except (EOFError, OSError, ValueError):
+            pass
+
+        with self._lock:
+            if self._channel is channel:
+                self._fail_pending(ShellError("Remote shell exited"))
+
+    def _fail_pending(self, error):
+        """
+        Fail all requests that are in flight. Must be called with the lock held.
+        """
+        for request in self._pending.values():
+            request.set_error(error)
+        self._pending.clear()
+
+    def submit(self, command):
+        """
+        Send a command to the shell without waiting for the response.
+        :param command: str, shell command
+        :return: ShellRequest
+        """
+        with self._lock:
+            if not self.is_alive():
+                if self._channel is not None:
+                    self.restarts += 1
+                    self._channel.close()
+                self._start()
+
+            self._next_rid += 1
+            request = ShellRequest(self._next_rid, command)
+            self._pending[request.rid] = request
+            self._channel.sendall(f"__qg {request.rid} {shlex.quote(command)}\n".encode("utf-8"))
+        return request
+
+    def run(self, command):
+        """
+        Run a command and wait for the response. A stalled shell is restarted.
+        :param command: str, shell command
+        :return: BatchResult(stdout, stderr, exit_code)
+        """
+        request = self.submit(command)
+        try:
+            return request.result(self.timeout)
+        except TimeoutError:
+            self.restart()
+            raise
+
+    def restart(self):
+        """
+        Kill the shell and fail all requests in flight. A new shell is started on the next request.
+        """
+        with self._lock:
+            if self._channel is not None:
+                self._channel.close()
+            self._fail_pending(ShellError("Remote shell was restarted"))
+
+    def close(self):
+        self.restart()
+        self._channel = None
@@ -0,0 +1,312 @@
+import time
+from collections import namedtuple
+
+
+# Fields of a job in the queue. The job name is the only free-form field, so it is placed
+# last: splitting with maxsplit then keeps names with spaces or delimiters intact.
+QUEUE_FIELDS = [("jobid", "%i"), ("partition", "%P"), ("state", "%T"), ("user", "%u"), ("time", "%M"),
+                ("timelimit", "%l"), ("nodes", "%D"), ("cpus", "%C"), ("reason", "%R"), ("name", "%j")]
+QUEUE_DELIMITER = "|"
+
+QueueJob = namedtuple("QueueJob", [field for field, _ in QUEUE_FIELDS])
+
+# Columns of the queue view: (header, field)
+QUEUE_COLUMNS = [("NAME", "name"), ("JOBID", "jobid"), ("PARTITION", "partition"), ("STATE", "state"),
+                 ("USER", "user"), ("TIME", "time"), ("TIME_LIMIT", "timelimit"), ("NODES", "nodes"),
+                 ("NODELIST(REASON)", "reason")]
+
+# Text tags used for color coding, by job state
+STATE_TAGS = {
+    "RUNNING": "job_running",
+    "PENDING": "job_pending",
+    "TIMEOUT": "job_timeout",
+    "COMPLETED": "job_completed",
+    "COMPLETING": "job_completed",
+    "CANCELLED": "job_cancelled",
+}
+
+# Job states selected by the status options of squeue -t
+STATE_CODES = {
+    "r": "RUNNING",
+    "pd": "PENDING",
+    "cd": "COMPLETED",
+    "ca": "CANCELLED",
+    "to": "TIMEOUT",
+}
+
+# Jobs in these states do not change anymore
+FINAL_STATES = ["COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL", "PREEMPTED",
+                "BOOT_FAIL", "DEADLINE"]
+
+
+def squeue_command(user=None, status=None):
+    """
+    Build a squeue command whose output can be parsed by parse_squeue.
+
+    :param user: str, user name. None or "all" for all users
+    :param status: str, state filter passed to squeue -t
+    :return: str
+    """
+    fmt = QUEUE_DELIMITER.join(code for _, code in QUEUE_FIELDS)
+    cmd = f"squeue -h -S i -o '{fmt}'"
+    if status is not None:
+        cmd += f" -t {status}"
+    if user is not None and user != "all":
+        cmd += f" -u {user}"
+    return cmd
+
+
+def make_job(**fields):
+    """
+    Make a QueueJob with typed fields from strings (e.g. from the remote agent).
+    :return: QueueJob
+    """
+    fields["nodes"] = int(fields["nodes"]) if str(fields["nodes"]).isdigit() else 0
+    fields["cpus"] = int(fields["cpus"]) if str(fields["cpus"]).isdigit() else 0
+    return QueueJob(**fields)
+
+
+def parse_squeue(output):
+    """
+    Parse the output of the command made by squeue_command.
+
+    :param output: str
+    :return: list of QueueJob
+    """
+    jobs = []
+    for line in output.splitlines():
+        values = line.split(QUEUE_DELIMITER, len(QUEUE_FIELDS) - 1)
+        if len(values) != len(QUEUE_FIELDS):
+            continue
+        jobs.append(make_job(**dict(zip(QueueJob._fields, values))))
+    return jobs
+
+
+def select_jobs(jobs, user=None, status=None):
+    """
+    Select jobs like squeue -u user -t status would.
+
+    :param jobs: list of QueueJob
+    :param user: str, user name. None or "all" for all users
+    :param status: str, key of STATE_CODES. None or "all" for all states
+    :return: list of QueueJob
+    """
+    if user is not None and user != "all":
+        jobs = [job for job in jobs if job.user == user]
+    if status is not None and status != "all":
+        state = STATE_CODES.get(status.lower(), status.upper())
+        jobs = [job for job in jobs if job.state.split()[0] == state]
+    return jobs
+
+
+def count_states(jobs):
+    """
+    :param jobs: list of QueueJob
+    :return: tuple, (running, pending)
+    """
+    states = [job.state for job in jobs]
+    return states.count("RUNNING"), states.count("PENDING")
+
+
+def state_tag(state):
+    return STATE_TAGS.get(state.split()[0] if state else "")
+
+
+def format_queue(jobs, last_write=None, now=None):
+    """
+    Format jobs as right-aligned text columns, as squeue would print them, with the
+    column widths computed from the jobs themselves.
+
+    :param jobs: list of QueueJob
+    :param last_write: dict, job ID to the time its output file was last written. If given, a
+                       LAST_WRITE column shows how long ago that was, and is empty for other jobs
+    :param now: float, time.time() to count from. Defaults to now
+    :return: tuple, (header line, list of job lines), lines without newline
+    """
+    columns = list(QUEUE_COLUMNS)
+    if last_write is not None:
+        columns.insert(-1, ("LAST_WRITE", None))
+        now = time.time() if now is None else now
+
+    def cell(job, field):
+        if field is not None:
+            return str(getattr(job, field))
+        mtime = last_write.get(job.jobid)
+        return format_duration(max(int(now - mtime), 0)) if mtime is not None else ""
+
+    widths = [len(header) for header, _ in columns]
+    rows = []
+    for job in jobs:
+        row = [cell(job, field) for _, field in columns]
+        widths = [max(w, len(value)) for w, value in zip(widths, row)]
+        rows.append(row)
+
+    # The last column is left-aligned and not padded, like in squeue
+    def fmt(row):
+        return " ".join([value.rjust(w) for value, w in zip(row[:-1], widths[:-1])] + [row[-1]])
+
+    return fmt([header for header, _ in columns]), [fmt(row) for row in rows]
+
+
+CpuUsage = namedtuple("CpuUsage", ["user", "partition", "running", "pending"])
+
+# Sum the running and pending CPUs per user and partition on the login node, so that only one
+# line per user and partition is transferred instead of one per job
+CPU_USAGE_COMMAND = ("squeue -h -t R,PD -o '%u|%P|%C|%t' | "
+                     "awk -F'|' '{k = $1 \"|\" $2; seen[k] = 1; if ($4 == \"R\") r[k] += $3; else p[k] += $3} "
+                     "END {for (k in seen) print k \"|\" r[k] + 0 \"|\" p[k] + 0}'")
+
+
+def parse_cpu_usage(output):
+    """
+    Parse the output of CPU_USAGE_COMMAND.
+
+    :param output: str
+    :return: list of CpuUsage
+    """
+    usage = []
+    for line in output.splitlines():
+        values = line.split("|")
+        if len(values) == 4 and values[2].isdigit() and values[3].isdigit():
+            usage.append(CpuUsage(values[0], values[1], int(values[2]), int(values[3])))
+    return usage
+
+
+def format_cpu_usage(usage, cpus_total):
+    """
+    Format the CPU usage as a table with one row per user, sorted by running CPUs. The running
+    and pending CPUs are given in total, and split by partition.
+
+    :param usage: list of CpuUsage
+    :param cpus_total: int, number of CPUs in the cluster
+    :return: tuple, (header line, list of (user, line), line with the sums)
+    """
+    # Everything is summed in a single pass, per user and per partition
+    users = {}
+    partitions = {}
+    for u in usage:
+        row = users.setdefault(u.user, {"running": 0, "pending": 0})
+        row["running"] += u.running
+        row["pending"] += u.pending
+        row[u.partition] = f"{u.running}/{u.pending}"
+        running, pending = partitions.get(u.partition, (0, 0))
+        partitions[u.partition] = (running + u.running, pending + u.pending)
+
+    # Users and partitions with the most running CPUs first
+    order = sorted(partitions, key=lambda p: partitions[p][0], reverse=True)
+    users = sorted(users.items(), key=lambda item: item[1]["running"], reverse=True)
+
+    def columns(name, running, pending, split):
+        return [name, str(running), f"{100 * running / cpus_total:.2f}", str(pending)] + split
+
+    header = ["User", "Run", "%", "Pend"] + [f"{p} (R/P)" for p in order]
+    rows = [columns(user, row["running"], row["pending"], [row.get(p, "") for p in order]) for user, row in users]
+    total = columns("SUM:",
+                    sum(row["running"] for _, row in users),
+                    sum(row["pending"] for _, row in users),
+                    ["{}/{}".format(*partitions[p]) for p in order])
+
+    widths = [max(len(row[i]) for row in rows + [header, total]) for i in range(len(header))]
+
+    def fmt(row):
+        return " ".join([row[0].ljust(widths[0])] + [value.rjust(w) for value, w in zip(row[1:], widths[1:])])
+
+    return fmt(header), [(user, fmt(row)) for (user, _), row in zip(users, rows)], fmt(total)
+
+
+def parse_duration(value):
+    """
+    Parse a Slurm duration: minutes, minutes:seconds, hours:minutes:seconds, days-hours,
+    days-hours:minutes or days-hours:minutes:seconds.
+
+    :param value: str
+    :return: int, seconds. None for UNLIMITED, Partition_Limit, empty or invalid values
+    """
+    days, _, clock = value.strip().rpartition("-")
+    parts = clock.split(":")
+    if len(parts) > 3:
+        return None
+    if days:  # the clock starts with the hours
+        parts += ["0"] * (3 - len(parts))
+    elif len(parts) == 1:  # minutes only
+        parts.append("0")
+    try:
+        seconds = 0
+        for part in parts:
+            seconds = seconds * 60 + int(part)
+        return seconds + int(days or 0) * 86400
+    except ValueError:
+        return None
+
+
+def format_duration(seconds):
+    """
+    :param seconds: int, or None for no limit
+    :return: str, like Slurm prints durations
+    """
+    if seconds is None:
+        return "UNLIMITED"
+    days, seconds = divmod(seconds, 86400)
+    clock = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{days}-{clock}" if days else clock
+
+
+def format_elapsed(seconds):
+    """
+    :param seconds: int
+    :return: str, like squeue prints the elapsed time of a job, e.g. 3:04, 1:02:03 or 1-02:03:04
+    """
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f"{days}-{hours:02d}:{minutes:02d}:{seconds:02d}"
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def parse_timestamp(value):
+    """
+    :param value: str, like 2020-03-01T10:00:00
+    :return: int, seconds since the epoch. None for Unknown, None or invalid values
+    """
+    try:
+        return int(time.mktime(time.strptime(value.strip(), "%Y-%m-%dT%H:%M:%S")))
+    except ValueError:
+        return None
+
+
+def format_timestamp(timestamp):
+    """
+    :param timestamp: int, seconds since the epoch, or None
+    :return: str
+    """
+    return "Unknown" if timestamp is None else time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+
+
+def parse_size(value):
+    """
+    :param value: str, like 1024K or 1.5G
+    :return: int, bytes. 0 for empty or invalid values
+    """
+    value = value.strip()
+    factors = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    try:
+        if value and value[-1] in factors:
+            return int(float(value[:-1]) * factors[value[-1]])
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+
+def format_size(size):
+    """
+    :param size: int, bytes
+    :return: str, like 1.5G
+    """
+    for unit in ["", "K", "M", "G"]:
+        if size < 1024:
+            return f"{size:.3g}{unit}" if unit else str(size)
+        size /= 1024
+    return f"{size:.3g}T"
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import slurm
+
+
+class QueueSnapshot:
+    def __init__(self, fetch, ttl=4.0, user=None):
+        """
+        The last known state of the queue of the monitored user, shared by all views of that
+        user. The jobs of the user are fetched once for all states, and views, job counters and
+        filters select from the snapshot, so any of them costs no remote calls while the snapshot
+        is fresh. Other users, or the whole cluster, are not covered, and must be queried on demand.
+
+        While a stream of queue changes is applied, the snapshot never goes stale, and the elapsed
+        times of running jobs are advanced locally, as the stream only sends them now and then.
+
+        :param fetch: callable, takes the user and returns a list of slurm.QueueJob in all states
+        :param ttl: float, seconds a snapshot is considered fresh
+        :param user: str, the monitored user. None for all users
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.user = user
+
+        self.jobs = []
+        self.timestamp = None  # time.time() of the last fetch, None if never fetched
+        self.fetches = 0
+        self.changed = False  # whether the last fetch saw jobs of the user appear, disappear or change state
+        self.streaming = False  # whether a stream of changes keeps the snapshot up to date
+        self._states = None
+        self._sampled = {}  # job ID to time.time() when its elapsed time was received
+
+        self._lock = threading.Lock()  # held while fetching, so concurrent refreshes are coalesced
+
+    def __repr__(self):
+        return f"<QueueSnapshot(user={self.user}, jobs={len(self.jobs)}, age={self.age()})>"
+
+    def covers(self, user):
+        """
+        :param user: str, see slurm.select_jobs
+        :return: bool, whether the jobs of user can be selected from the snapshot
+        """
+        return self.user in (None, "all") or user == self.user
+
+    def age(self):
+        """
+        :return: float, seconds since the last fetch. None if never fetched
+        """
+        return None if self.timestamp is None else time.time() - self.timestamp
+
+    def is_fresh(self):
+        age = self.age()
+        return age is not None and (self.streaming or age < self.ttl)
+
+    def invalidate(self):
+        """
+        Force the next get() to fetch, e.g. after jobs have been submitted or killed.
+        """
+        self.timestamp = None
+
+    def refresh(self):
+        """
+        Fetch the queue, unless another thread fetched it while we were waiting for the lock.
+        May block on remote calls, so only call this from a worker thread.
+        :return: list of QueueJob
+        """
+        started = time.time()
+        with self._lock:
+            if self.timestamp is None or self.timestamp < started:
+                self._store(self.fetch(self.user))
+                self.fetches += 1
+            return self.jobs
+
+    def apply(self, jobs, removed=(), full=False, times=None):
+        """
+        Update the snapshot from a stream of queue changes.
+
+        :param jobs: list of QueueJob, jobs that appeared or changed
+        :param removed: list of str, IDs of jobs that left the queue
+        :param full: bool, whether jobs is the whole queue
+        :param times: dict, job ID to elapsed time, for jobs that did not change otherwise
+        :return: list of QueueJob, the updated snapshot
+        """
+        with self._lock:
+            if full:
+                self._store(list(jobs))
+            else:
+                times = times or {}
+                updated = {job.jobid: job for job in jobs}
+                current = [updated.pop(job.jobid, job) for job in self.jobs if job.jobid not in removed]
+                current = [job._replace(time=times[job.jobid]) if job.jobid in times else job for job in current]
+                self._store(current + list(updated.values()), sampled={job.jobid for job in jobs} | times.keys())
+            return self.jobs
+
+    def _store(self, jobs, sampled=None):
+        """
+        :param jobs: list of QueueJob, the new snapshot
+        :param sampled: set of str, IDs of the jobs whose elapsed time was just received. None for all
+        """
+        self.jobs = jobs
+        self.timestamp = time.time()
+        self._sampled = {job.jobid: self.timestamp if sampled is None or job.jobid in sampled
+                         else self._sampled.get(job.jobid, self.timestamp) for job in jobs}
+
+        # Elapsed times change on every fetch, so only the states are compared. Only the jobs of the
+        # monitored user count, as other users' jobs change all the time on a busy cluster
+        states = {job.jobid: job.state for job in slurm.select_jobs(jobs, self.user)}
+        self.changed = self._states is not None and states != self._states
+        self._states = states
+
+    def get(self, user=None, status=None):
+        """
+        Select jobs from the snapshot, and refresh it first if it is stale.
+        May block on remote calls, so only call this from a worker thread.
+
+        :param user: str, see slurm.select_jobs. Must be covered by the snapshot
+        :param status: str, see slurm.select_jobs
+        :return: list of QueueJob
+        """
+        if not self.covers(user):
+            raise ValueError(f"The queue snapshot of {self.user} does not cover {user}")
+        if not self.is_fresh():
+            self.refresh()
+        return slurm.select_jobs(self._current(), user, status)
+
+    def cached(self, user=None, status=None):
+        """
+        Select jobs from the snapshot without refreshing it. Safe to call from the Tk thread.
+        :return: list of QueueJob, None if the snapshot is stale or does not cover user
+        """
+        if not self.is_fresh() or not self.covers(user):
+            return None
+        return slurm.select_jobs(self._current(), user, status)
+
+    def _current(self):
+        """
+        :return: list of QueueJob, with the elapsed times of running jobs advanced to now while streaming
+        """
+        jobs, sampled = self.jobs, self._sampled
+        if not self.streaming:
+            return jobs
+        now = time.time()
+        current = []
+        for job in jobs:
+            seconds = slurm.parse_duration(job.time) if job.state == "RUNNING" else None
+            if seconds is not None and job.jobid in sampled:
+                job = job._replace(time=slurm.format_elapsed(seconds + int(now - sampled[job.jobid])))
+            current.append(job)
+        return current
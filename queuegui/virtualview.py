@@ -0,0 +1,203 @@
+import tkinter as tk
+from tkinter import font
+
+import helpers
+
+HEADER_TAG = "view_header"
+
+
+class VirtualView:
+    def __init__(self, text, scrollbar, on_window=None):
+        """
+        Show a table of any length in a Text widget, by only inserting the rows that are visible.
+        The rows are kept in a model, and scrolling, sorting and filtering work on the model. The
+        vertical scrollbar is driven by the model while a table is shown, and by the Text widget
+        when anything else is written to it, so other views can keep using the widget directly.
+
+        :param text: tk.Text
+        :param scrollbar: tk.Scrollbar, vertical scrollbar of text
+        :param on_window: callable, called with the rows in view, as (key, line, tag), whenever they change
+        """
+        self.text = text
+        self.scrollbar = scrollbar
+        self.on_window = on_window
+
+        self.header = None
+        self.rows = []  # (key, line, tag)
+        self.first = 0  # index of the first visible row
+        self.shown = []  # (key, (line, tag)) as inserted in the widget, header first
+        self.sort_column = None  # (column index, reverse)
+
+        self.text.config(yscrollcommand=self._on_text_scroll)
+        self.scrollbar.config(command=self.yview)
+        self.text.bind("<MouseWheel>", self._on_wheel, add="+")
+        self.text.bind("<Button-4>", self._on_wheel, add="+")
+        self.text.bind("<Button-5>", self._on_wheel, add="+")
+        self.text.bind("<Configure>", self._on_configure, add="+")
+        self.text.tag_bind(HEADER_TAG, "<Button-1>", self._on_header_click)
+
+    def __repr__(self):
+        return f"<VirtualView(rows={len(self.rows)}, first={self.first})>"
+
+    def is_shown(self):
+        """
+        :return: bool, whether the widget still shows the table, and not the output of another view
+        """
+        return (bool(self.shown)
+                and self.text.get(1.0, "1.end") == self.shown[0][1][0]
+                and self.text.index("end-1c") == f"{len(self.shown) + 1}.0")
+
+    def visible(self):
+        """
+        :return: int, number of rows that fit in the widget below the header
+        """
+        height = self.text.winfo_height()
+        if height > 1:
+            try:
+                linespace = font.nametofont(str(self.text.cget("font"))).metrics("linespace")
+            except tk.TclError:
+                linespace = font.Font(font=self.text.cget("font")).metrics("linespace")
+            lines = height // max(linespace, 1)
+        else:  # not mapped yet
+            lines = int(self.text.cget("height"))
+        return max(lines - 1, 1)
+
+    def show(self, header, rows):
+        """
+        Show a table. If a table with the same columns is already shown, the scroll position
+        and sort order are kept, and only the rows that changed are updated in the widget.
+
+        :param header: str, header line
+        :param rows: list of (key, line, tag), where key identifies the row (e.g. the job ID)
+                     and tag is a text tag for the line, or None
+        """
+        if not self.is_shown():
+            self.text.delete(1.0, tk.END)
+            self.shown = []
+            self.first = 0
+        if self.header is None or self.header.split() != header.split():
+            self.sort_column = None
+
+        self.header = header
+        self.rows = list(rows)
+        if self.sort_column is not None:
+            self._sort()
+        self.refresh()
+
+    def refresh(self):
+        """
+        Insert the visible rows in the widget, and update the scrollbar.
+        """
+        visible = self.visible()
+        self.first = max(0, min(self.first, len(self.rows) - visible))
+        window = [(None, (self.header, HEADER_TAG))]
+        window += [(key, (line, tag or ())) for key, line, tag in self.rows[self.first:self.first + visible]]
+
+        self.text.config(state=tk.NORMAL)
+        edits = helpers.diff_rows(self.shown, window)
+        for edit, start, arg in edits:
+            if edit == "delete":
+                self.text.delete(f"{start + 1}.0", f"{arg + 1}.0")
+            else:
+                chunks = []
+                for line, tag in arg:
+                    chunks += [line, tag, "\n", ()]
+                self.text.insert(f"{start + 1}.0", *chunks)
+        self.shown = window
+
+        n = max(len(self.rows), 1)
+        self.scrollbar.set(self.first / n, min((self.first + visible) / n, 1.0))
+
+        if edits and self.on_window is not None:
+            self.on_window(self.rows[self.first:self.first + visible])
+
+    def yview(self, *args):
+        """
+        Command of the scrollbar.
+        """
+        if not self.is_shown():
+            return self.text.yview(*args)
+
+        visible = self.visible()
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            self.first += int(args[1]) * (visible if args[2] == "pages" else 1)
+        self.refresh()
+
+    def filter(self, predicate):
+        """
+        Show only the rows whose line satisfies predicate.
+        :param predicate: callable, takes a line and returns a bool
+        """
+        self.show(self.header, [row for row in self.rows if predicate(row[1])])
+
+    def sort(self, column, reverse=False):
+        """
+        Sort the rows by a column of the header.
+        :param column: int, index of the column, as in header.split()
+        :param reverse: bool
+        """
+        self.sort_column = (column, reverse)
+        self._sort()
+        self.refresh()
+
+    def _sort(self):
+        column, reverse = self.sort_column
+        spans = column_spans(self.header)
+        if column >= len(spans):
+            return
+        start, end = spans[column]
+
+        def key(row):
+            value = row[1][start:end].strip()
+            return (0, int(value), "") if value.isdigit() else (1, 0, value)
+
+        self.rows.sort(key=key, reverse=reverse)
+
+    def _on_text_scroll(self, first, last):
+        # While a table is shown, the scrollbar shows the position in the model instead
+        if not self.is_shown():
+            self.scrollbar.set(first, last)
+
+    def _on_wheel(self, event):
+        if not self.is_shown():
+            return None
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.yview("scroll", -3, "units")
+        else:
+            self.yview("scroll", 3, "units")
+        return "break"
+
+    def _on_configure(self, event):
+        if self.is_shown():
+            self.refresh()
+
+    def _on_header_click(self, event):
+        char = int(self.text.index(f"@{event.x},{event.y}").split(".")[1])
+        for column, (start, end) in enumerate(column_spans(self.header)):
+            if start <= char < end:
+                reverse = self.sort_column == (column, False)
+                self.sort(column, reverse)
+                return "break"
+
+
+def column_spans(header):
+    """
+    Find the character span of each column, assuming right-aligned columns like in squeue and
+    sacct: a column extends from the end of the previous header to the end of its own header.
+    The last column extends to the end of the line.
+
+    :param header: str
+    :return: list of (start, end)
+    """
+    spans = []
+    start = 0
+    pos = 0
+    for word in header.split():
+        pos = header.index(word, pos) + len(word)
+        spans.append((start, pos))
+        start = pos
+    if spans:
+        spans[-1] = (spans[-1][0], 1 << 30)
+    return spans
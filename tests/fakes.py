@@ -0,0 +1,96 @@
+"""Stand-ins for Tk widgets and paramiko objects, shared by the tests."""
+import subprocess
+import shlex
+import os
+import sys
+
+
+class FakeWidget:
+    """Stand-in for a Tk widget. after() callbacks are run manually by calling tick()."""
+    def __init__(self):
+        self.scheduled = {}
+        self.counter = 0
+
+    def after(self, ms, func, *args):
+        self.counter += 1
+        self.scheduled[self.counter] = (func, args)
+        return self.counter
+
+    def after_cancel(self, after_id):
+        self.scheduled.pop(after_id, None)
+
+    def tick(self):
+        scheduled, self.scheduled = self.scheduled, {}
+        for func, args in scheduled.values():
+            func(*args)
+
+
+class LocalSFTP:
+    """Stand-in for a paramiko SFTPClient, rooted in a local "home" directory."""
+    def __init__(self, home):
+        self.home = home
+        self.uploads = 0
+
+    def stat(self, path):
+        return os.stat(os.path.join(self.home, path))
+
+    def mkdir(self, path):
+        os.mkdir(os.path.join(self.home, path))
+
+    def putfo(self, fo, path):
+        self.uploads += 1
+        with open(os.path.join(self.home, path), "wb") as f:
+            f.write(fo.read())
+
+
+class LocalChannel:
+    """Stand-in for a paramiko Channel that runs the command in a local process."""
+    def __init__(self, session):
+        self.session = session
+        self.closed = False
+
+    def exec_command(self, cmd):
+        self.session.started += 1
+        args = shlex.split(cmd)
+        args[0] = sys.executable if args[0] == "python3" else args[0]
+        env = None
+        if self.session.home is not None:
+            # Fake Slurm commands are picked up from bin/ in the home directory
+            env = dict(os.environ, PATH=os.pathsep.join([os.path.join(self.session.home, "bin"), os.environ["PATH"]]))
+        try:
+            self.process = subprocess.Popen(args, cwd=self.session.home, env=env,
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except FileNotFoundError:
+            self.process = subprocess.Popen(["false"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def sendall(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def recv(self, n):
+        try:
+            return self.process.stdout.read1(n)
+        except ValueError:  # closed
+            return b""
+
+    def close(self):
+        self.closed = True
+        self.process.kill()
+        self.process.wait()
+        for pipe in [self.process.stdin, self.process.stdout]:
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+
+
+class LocalSession:
+    """Stand-in for a session.Session whose channels run locally, in home if given."""
+    def __init__(self, home=None):
+        self.home = home
+        self.started = 0
+        self.sftp = LocalSFTP(home) if home is not None else None
+        self.transport = self
+
+    def open_session(self):
+        return LocalChannel(self)
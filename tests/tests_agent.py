@@ -0,0 +1,113 @@
+import unittest
+import base64
+import queue
+import time
+import tempfile
+import shutil
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agent import AgentClient, AgentError, AgentUnavailable
+from jobrecord import JobRecord, format_scontrol
+from fakes import LocalSession
+
+
+class TestAgent(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.session = LocalSession(self.home)
+        self.agent = AgentClient(self.session, timeout=10)
+
+        self.datafile = os.path.join(self.home, "job 42.out")
+        with open(self.datafile, "w") as f:
+            f.write("line 1\nline 2\n")
+
+    def tearDown(self):
+        self.agent.close()
+        shutil.rmtree(self.home)
+
+    def test_requests(self):
+        self.assertTrue(self.agent.start())
+        self.assertEqual(self.session.sftp.uploads, 1)
+
+        requests = [self.agent.submit("stat", paths=[self.datafile, self.datafile + "x"]),
+                    self.agent.submit("read", path=self.datafile, offset=7),
+                    self.agent.submit("scandir", path=self.home)]
+        stat, read, scandir = [r.result(10) for r in requests]
+
+        self.assertEqual([st["exists"] for st in stat], [True, False])
+        self.assertEqual(stat[0]["size"], 14)
+        self.assertEqual(base64.b64decode(read["data"]), b"line 2\n")
+        self.assertIn("job 42.out", [entry["name"] for entry in scandir["entries"]])
+
+        with self.assertRaises(AgentError):
+            self.agent.call("read", path=self.datafile + "x")
+
+    def test_watch_queue(self):
+        os.mkdir(os.path.join(self.home, "bin"))
+        squeue = os.path.join(self.home, "bin", "squeue")
+        with open(squeue, "w") as f:
+            f.write(f"#!/bin/sh\ncat {os.path.join(self.home, 'queue.txt')}\n")
+        os.chmod(squeue, 0o755)
+
+        def set_queue(*jobs):
+            with open(os.path.join(self.home, "queue.txt"), "w") as f:
+                for jobid, state, time in jobs:
+                    f.write("\x1f".join([jobid, "name", "normal", state, "ambr", time, "1:00:00", "1", "4", "None"]) + "\n")
+
+        events = queue.Queue()
+        set_queue(("1", "RUNNING", "0:01"), ("2", "PENDING", "0:00"))
+        self.assertTrue(self.agent.start())
+        stream = self.agent.subscribe("watch_queue", events.put, interval=0.05, heartbeat=0.5)
+
+        event = events.get(timeout=10)
+        self.assertTrue(event["full"])
+        self.assertEqual([job["jobid"] for job in event["jobs"]], ["1", "2"])
+
+        # Elapsed times are no change, and only sent with the heartbeat
+        set_queue(("1", "RUNNING", "0:02"), ("2", "PENDING", "0:00"))
+        time.sleep(0.2)
+        self.assertTrue(events.empty())
+        event = events.get(timeout=10)
+        self.assertEqual((event["jobs"], event["removed"], event["times"]), ([], [], {"1": "0:02", "2": "0:00"}))
+
+        set_queue(("2", "RUNNING", "0:01"), ("3", "PENDING", "0:00"))
+        event = events.get(timeout=10)
+        self.assertEqual([(job["jobid"], job["state"]) for job in event["jobs"]], [("2", "RUNNING"), ("3", "PENDING")])
+        self.assertEqual(event["removed"], ["1"])
+
+        self.agent.unsubscribe(stream)
+        self.assertIsNone(stream.result(10))
+
+    def test_jobinfo(self):
+        os.mkdir(os.path.join(self.home, "bin"))
+        scontrol = os.path.join(self.home, "bin", "scontrol")
+        with open(scontrol, "w") as f:
+            f.write('#!/bin/sh\n[ "$4" = 42 ] || exit 1\n'
+                    'echo "JobId=42 JobName=h2o opt JobState=RUNNING WorkDir=/home/ambr StdOut=/home/ambr/h2o.out"\n')
+        os.chmod(scontrol, 0o755)
+
+        self.assertTrue(self.agent.start())
+        record = JobRecord("42", format_scontrol(self.agent.call("jobinfo", jobid="42")))
+        self.assertEqual((record.get("JobName"), record.state, record.jobname), ("h2o opt", "RUNNING", "h2o"))
+        with self.assertRaises(AgentError):
+            self.agent.call("jobinfo", jobid="43")
+
+    def test_upload_once(self):
+        self.assertTrue(self.agent.start())
+        self.agent.close()
+        self.assertTrue(self.agent.start())
+        self.assertEqual(self.session.sftp.uploads, 1)
+
+    def test_no_python(self):
+        agent = AgentClient(self.session, timeout=10, python="no-such-python")
+        self.assertFalse(agent.start())
+        with self.assertRaises(AgentUnavailable):
+            agent.call("ping")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+from cpuhistory import CpuHistory, sparkline, format_trends
+from slurm import CpuUsage
+
+
+class TestCpuHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.history = CpuHistory(capacity=3)
+        self.history.add(100, [CpuUsage("ambr", "normal", 10, 5), CpuUsage("ambr", "bigmem", 2, 0)])
+        self.history.add(200, [CpuUsage("bob", "normal", 40, 0)])
+
+    def test_series(self):
+        self.assertEqual(self.history.series(), ([100, 200], [12, 40], [5, 0]))
+        self.assertEqual(self.history.series("ambr"), ([100, 200], [12, 0], [5, 0]))
+        self.assertEqual(self.history.series("bob", since=150), ([200], [40], [0]))
+        self.assertEqual(self.history.series("nobody"), ([100, 200], [0, 0], [0, 0]))
+
+    def test_ring(self):
+        for t in [300, 400]:
+            self.history.add(t, [CpuUsage("ambr", "normal", t, 0)])
+        self.assertEqual(len(self.history), 3)
+        self.assertEqual(self.history.series("ambr"), ([200, 300, 400], [0, 300, 400], [0, 0, 0]))
+
+    def test_evict(self):
+        self.history.add(300, [])
+        self.assertEqual(sorted(self.history.users), ["ambr", "bob"])
+        self.history.add(400, [])
+        self.assertEqual(list(self.history.users), ["bob"])
+        self.history.add(500, [])
+        self.assertEqual(self.history.users, {})
+        self.assertEqual(self.history.series("bob"), ([300, 400, 500], [0, 0, 0], [0, 0, 0]))
+
+    def test_sparkline(self):
+        self.assertEqual(sparkline([0, 4, 8]), "▁▅█")
+        self.assertEqual(sparkline([0, 8], top=16), "▁▅")
+        self.assertEqual(sparkline(list(range(100)), width=10)[-1], "█")
+        self.assertEqual(len(sparkline(list(range(100)), width=10)), 10)
+        self.assertEqual(sparkline([]), "")
+
+    def test_trends(self):
+        lines = format_trends(self.history, ["bob", "ambr"], now=300)
+        self.assertIn("Running CPUs, last hour: ▃█ (12-40)", lines)
+        self.assertEqual(lines[-2:], ["bob  ▁█", "ambr ▃▁"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+import tempfile
+import threading
+import shutil
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+from downloadcache import DownloadCache
+
+
+class LocalSftp:
+    """Stand-in for paramiko.SFTPClient that works on local files."""
+    def __init__(self):
+        self.gets = 0
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def open(self, path, mode="r"):
+        return open(path, mode)
+
+    def get(self, path, local_path):
+        self.gets += 1
+        shutil.copyfile(path, local_path)
+
+
+class TestDownloadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.remote = os.path.join(self.dir, "job.out")
+        self.local = os.path.join(self.dir, "local.out")
+        self.sftp = LocalSftp()
+        self.cache = DownloadCache(overlap=8, chunk_size=5)
+        self.mtime = 1000
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, mode, data):
+        with open(self.remote, mode) as f:
+            f.write(data)
+        self.mtime += 10
+        os.utime(self.remote, (self.mtime, self.mtime))
+
+    def fetch(self):
+        self.cache.fetch(self.sftp, self.remote, self.local)
+        with open(self.local, "rb") as f:
+            return f.read()
+
+    def test_append(self):
+        self.write("wb", b"SCF iteration 1\n")
+        self.assertEqual(self.fetch(), b"SCF iteration 1\n")
+        self.assertEqual(self.fetch(), b"SCF iteration 1\n")
+        self.assertEqual(self.cache.transferred, 16)
+
+        self.write("ab", b"SCF iteration 2\nSCF done\n")
+        self.assertEqual(self.fetch(), b"SCF iteration 1\nSCF iteration 2\nSCF done\n")
+        self.assertEqual(self.sftp.gets, 1)
+        self.assertEqual(self.cache.transferred, 16 + 8 + 25)
+
+    def test_rewrite(self):
+        self.write("wb", b"SCF iteration 1\n")
+        self.fetch()
+
+        # Rewritten and longer
+        self.write("wb", b"New job, iteration 1\n")
+        self.assertEqual(self.fetch(), b"New job, iteration 1\n")
+        self.assertEqual(self.sftp.gets, 2)
+
+        # Shrunk
+        self.write("wb", b"short\n")
+        self.assertEqual(self.fetch(), b"short\n")
+        self.assertEqual(self.sftp.gets, 3)
+
+        # The local copy was changed
+        with open(self.local, "ab") as f:
+            f.write(b"edited")
+        self.write("ab", b"more\n")
+        self.assertEqual(self.fetch(), b"short\nmore\n")
+        self.assertEqual(self.sftp.gets, 4)
+
+        # Rewritten in place, to the same size
+        self.write("wb", b"SHort\nmore\n")
+        self.assertEqual(self.fetch(), b"SHort\nmore\n")
+        self.assertEqual(self.sftp.gets, 5)
+
+    def test_read(self):
+        # The appended range comes from the read callable, e.g. the remote agent, instead of sftp
+        reads = []
+
+        def read(path, offset, length):
+            reads.append((offset, length))
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+
+        self.sftp.open = None
+        self.write("wb", b"SCF iteration 1\n")
+        self.cache.fetch(self.sftp, self.remote, self.local, read)
+        self.write("ab", b"SCF done\n")
+        self.cache.fetch(self.sftp, self.remote, self.local, read)
+        with open(self.local, "rb") as f:
+            self.assertEqual(f.read(), b"SCF iteration 1\nSCF done\n")
+        self.assertEqual(reads, [(8, 8), (16, 5), (21, 4)])
+        self.assertEqual(self.sftp.gets, 1)
+
+    def test_concurrent(self):
+        # A slow transfer of one file does not hold up another file
+        other = os.path.join(self.dir, "other.out")
+        with open(other, "wb") as f:
+            f.write(b"other\n")
+        self.write("wb", b"SCF iteration 1\n")
+
+        started, release = threading.Event(), threading.Event()
+        get = self.sftp.get
+
+        def slow_get(path, local_path):
+            if path == self.remote:
+                started.set()
+                release.wait(10)
+            get(path, local_path)
+
+        self.sftp.get = slow_get
+        thread = threading.Thread(target=self.fetch)
+        thread.start()
+        self.assertTrue(started.wait(10))
+        self.cache.fetch(self.sftp, other, os.path.join(self.dir, "local_other.out"))
+        self.assertTrue(thread.is_alive())
+        release.set()
+        thread.join(10)
+        self.assertEqual(len(self.cache.downloads), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import threading
+import time
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from executor import RemoteExecutor
+from fakes import FakeWidget
+
+
+class TestRemoteExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.widget = FakeWidget()
+        self.errors = []
+        self.executor = RemoteExecutor(self.widget, workers=1, on_error=self.errors.append)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def run_until(self, condition, timeout=2):
+        t0 = time.time()
+        while not condition() and time.time() - t0 < timeout:
+            time.sleep(0.01)
+            self.widget.tick()
+
+    def test_callback_in_dispatcher(self):
+        results = []
+        self.executor.submit(lambda x: x * 2, 21, callback=lambda r: results.append((r, threading.current_thread())))
+        self.run_until(lambda: results)
+        self.assertEqual(results, [(42, threading.current_thread())])
+
+    def test_error(self):
+        self.executor.submit(lambda: 1 / 0)
+        self.run_until(lambda: self.errors)
+        self.assertIsInstance(self.errors[0], ZeroDivisionError)
+
+    def test_cancel(self):
+        gate = threading.Event()
+        results = []
+        self.executor.submit(gate.wait, tag="busy")
+        self.executor.submit(lambda: "stale", callback=results.append, tag="view")
+        self.assertEqual(self.executor.cancel("view"), 1)
+        self.executor.submit(lambda: "fresh", callback=results.append, tag="view")
+        gate.set()
+        self.run_until(lambda: results)
+        self.assertEqual(results, ["fresh"])
+
+    def test_post(self):
+        results = []
+        threading.Thread(target=self.executor.post, args=(results.append, "posted")).start()
+        self.run_until(lambda: results)
+        self.assertEqual(results, ["posted"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import subprocess
+import io
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+import helpers
+
+
+class LocalShell:
+    """Stand-in for a Session that runs the commands in a local shell."""
+    def __init__(self):
+        self.channels_opened = 0
+
+    def exec_command(self, cmd):
+        self.channels_opened += 1
+        shell = self
+
+        class Stdin(io.StringIO):
+            class channel:
+                @staticmethod
+                def shutdown_write():
+                    p = subprocess.run(cmd, shell=True, input=stdin.getvalue().encode(), capture_output=True)
+                    shell.stdout.write(p.stdout)
+                    shell.stderr.write(p.stderr)
+                    shell.stdout.seek(0)
+                    shell.stderr.seek(0)
+
+        stdin = Stdin()
+        self.stdout, self.stderr = io.BytesIO(), io.BytesIO()
+        return stdin, self.stdout, self.stderr
+
+
+class TestRunBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.shell = LocalShell()
+
+    def test_run_batch(self):
+        results = helpers.run_batch(self.shell, ["echo hi; echo oops >&2", "printf 'no newline'", "exit 3", "echo ''"])
+        self.assertEqual(self.shell.channels_opened, 1)
+        self.assertEqual(results[0], ("hi\n", "oops\n", 0))
+        self.assertEqual(results[1], ("no newline", "", 0))
+        self.assertEqual(results[2], ("", "", 3))
+        self.assertEqual(results[3], ("\n", "", 0))
+
+    def test_unfinished(self):
+        results = helpers.split_batch_output("a\n\nS 0 0\nb", "", "S", 2)
+        self.assertEqual(results[0], ("a\n", "", 0))
+        self.assertEqual(results[1], ("", "", None))
+
+    def test_is_remotedir(self):
+        self.assertTrue(helpers.is_remotedir(self.shell, "/"))
+        self.assertFalse(helpers.is_remotefile(self.shell, "/"))
+
+
+class TestStat(unittest.TestCase):
+
+    def test_stat(self):
+        here = os.path.abspath(__file__)
+        paths = [os.path.dirname(here) + "/missing file", here, os.path.dirname(here)]
+        output = subprocess.run(helpers.stat_command(paths), shell=True, capture_output=True, text=True).stdout
+        missing, found, directory = helpers.parse_stat(output, paths)
+        self.assertEqual(missing, {"path": paths[0], "exists": False})
+        self.assertEqual(found["size"], os.path.getsize(here))
+        self.assertEqual(found["mtime"], int(os.path.getmtime(here)))
+        self.assertFalse(found["is_dir"])
+        self.assertTrue(directory["is_dir"])
+
+
+class TestDiffRows(unittest.TestCase):
+
+    def apply(self, old, new):
+        shown = [row for _, row in old]
+        edits = helpers.diff_rows(old, new)
+        for edit, start, arg in edits:
+            if edit == "delete":
+                del shown[start:arg]
+            else:
+                shown[start:start] = arg
+        self.assertEqual(shown, [row for _, row in new])
+        return edits
+
+    def test_diff(self):
+        old = [(1, "a"), (2, "b"), (3, "c"), (4, "d")]
+        self.assertEqual(self.apply(old, old), [])
+        self.assertEqual(self.apply(old, [(1, "a"), (2, "B"), (3, "c"), (4, "d")]),
+                         [("delete", 1, 2), ("insert", 1, ["B"])])
+        self.apply(old, [(0, "z"), (1, "a"), (3, "C"), (5, "e"), (6, "f")])
+        self.apply(old, [])
+        self.apply([], old)
+
+
+if __name__ == "__main__":
+    unittest.main()
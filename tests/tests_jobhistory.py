@@ -0,0 +1,97 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+from jobhistory import JobHistoryStore
+from sacct import parse_sacct, format_history
+import slurm
+
+
+SACCT_DAY1 = """\
+100|ambr|normal|COMPLETED|01:00:00|1|4|2400|600|2020-03-01T10:00:00|2020-03-01T10:10:00||h2o opt
+100.batch|ambr||COMPLETED||1|4|2400|600|2020-03-01T10:00:00|2020-03-01T10:10:00|1024K|batch
+100.0|ambr||COMPLETED||1|4|2400|600|2020-03-01T10:00:00|2020-03-01T10:10:00|1.5G|mrchem
+101|ambr|normal|RUNNING|1-00:00:00|2|80|1200|300|2020-03-01T11:00:00|Unknown||a|b
+"""
+
+SACCT_DAY2 = """\
+100|ambr|normal|FAILED|01:00:00|1|4|2400|600|2020-03-01T10:00:00|2020-03-01T10:10:00||h2o opt
+101|ambr|normal|CANCELLED by 123|1-00:00:00|2|80|2400|600|2020-03-01T11:00:00|2020-03-02T11:10:00||a|b
+102|ambr|bigmem|PENDING|UNLIMITED|1|4|0|0|Unknown|Unknown||new
+"""
+
+
+class TestJobHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = JobHistoryStore(os.path.join(self.dir, "history.sqlite"))
+        self.commands = []
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dir)
+
+    def sync(self, output, starttime="2020-03-01"):
+        def run(cmd):
+            self.commands.append(cmd)
+            return output
+        return self.store.sync(run, "ambr", starttime)
+
+    def test_parse(self):
+        jobs = parse_sacct(SACCT_DAY1)
+        self.assertEqual([job.jobid for job in jobs], ["100", "101"])
+        self.assertEqual(jobs[0].steps, 2)
+        self.assertEqual(jobs[0].maxrss, 1536 << 20)
+        self.assertEqual(jobs[0].end - jobs[0].start, 600)
+        self.assertEqual(jobs[1].name, "a|b")
+        self.assertEqual(jobs[1].timelimit, 86400)
+        self.assertIsNone(jobs[1].end)
+        self.assertEqual(parse_sacct(SACCT_DAY2)[1].state, "CANCELLED")
+        self.assertIsNone(parse_sacct(SACCT_DAY2)[2].timelimit)
+
+    def test_sync(self):
+        self.assertFalse(self.store.is_synced("2020-03-01", 60))
+        self.sync(SACCT_DAY1)
+        self.assertIn("--starttime 2020-03-01T00:00:00", self.commands[0])
+        self.assertTrue(self.store.is_synced("2020-03-01", 60))
+        self.assertFalse(self.store.is_synced("2020-02-01", 60))
+
+        # Incremental: completed jobs are not updated, running jobs are
+        self.sync(SACCT_DAY2)
+        self.assertNotIn("2020-03-01T00:00:00", self.commands[1])
+        jobs = self.store.query()
+        self.assertEqual([(job.jobid, job.state) for job in jobs],
+                         [("100", "COMPLETED"), ("101", "CANCELLED"), ("102", "PENDING")])
+        self.assertEqual(jobs[0].steps, 2)
+
+    def test_query(self):
+        self.sync(SACCT_DAY1 + SACCT_DAY2.splitlines()[-1])
+        self.assertEqual([job.jobid for job in self.store.query(status="r")], ["101"])
+        self.assertEqual([job.jobid for job in self.store.query(starttime="2020-03-02")], ["101", "102"])
+        self.assertEqual([job.jobid for job in self.store.query(keywords=["h2o", "bigmem"])], ["100", "102"])
+
+        header, lines = format_history(self.store.query())
+        self.assertEqual(header.split()[:2], ["JobName", "JobID"])
+        self.assertEqual(len(set(len(line) for line in [header] + lines)), 1)
+        self.assertIn(" 1.5G ", lines[0])
+        self.assertIn(" UNLIMITED ", lines[2])
+
+    def test_durations(self):
+        self.assertEqual(slurm.parse_duration("1-02:03:04"), 93784)
+        self.assertEqual(slurm.parse_duration("03:04"), 184)
+        self.assertEqual(slurm.parse_duration("90"), 5400)
+        self.assertEqual(slurm.parse_duration("2-12"), 2 * 86400 + 12 * 3600)
+        self.assertEqual(slurm.parse_duration("2-12:30"), 2 * 86400 + 12 * 3600 + 30 * 60)
+        self.assertIsNone(slurm.parse_duration("1:02:03:04"))
+        self.assertIsNone(slurm.parse_duration("Partition_Limit"))
+        self.assertEqual(slurm.format_duration(93784), "1-02:03:04")
+        self.assertEqual([slurm.format_elapsed(s) for s in [0, 184, 3723, 93784]], ["0:00", "3:04", "1:02:03", "1-02:03:04"])
+        self.assertEqual(slurm.parse_size("1024K"), 1 << 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+from jobrecord import JobRecordCache, JobRecordStore, parse_scontrol
+from job import Job
+
+
+SCONTROL = """\
+JobId=1234 JobName=h2o opt.job
+   UserId=ambr(1000) GroupId=ambr(1000) MCS_label=N/A
+   JobState={state} Reason=None Dependency=(null)
+   RunTime=00:10:00 TimeLimit=01:00:00 TimeMin=N/A
+   Command=/home/ambr/h2o/h2o.job --fast
+   WorkDir=/home/ambr/h2o
+   StdErr=/home/ambr/h2o/h2o.out
+   StdOut=/home/ambr/h2o/h2o.out
+   TRES=cpu=4,mem=8G,node=1
+"""
+
+
+class TestJobRecordCache(unittest.TestCase):
+
+    def setUp(self):
+        self.state = "RUNNING"
+        self.cache = JobRecordCache(self.fetch, ttl=60)
+
+    def fetch(self, jobid):
+        return SCONTROL.format(state=self.state)
+
+    def test_parse(self):
+        fields = parse_scontrol(self.fetch("1234"))
+        self.assertEqual(fields["JobName"], "h2o opt.job")
+        self.assertEqual(fields["Command"], "/home/ambr/h2o/h2o.job --fast")
+        self.assertEqual(fields["TRES"], "cpu=4,mem=8G,node=1")
+        self.assertEqual(fields["UserId"], "ambr(1000)")
+
+        record = self.cache.get("1234")
+        self.assertEqual((record.jobname, record.workdir, record.state), ("h2o", "/home/ambr/h2o", "RUNNING"))
+        self.assertIsNone(JobRecordCache(lambda jobid: "slurm_load_jobs error").get("1").state)
+
+    def test_expiry(self):
+        self.cache.get("1234")
+        self.cache.get(" 1234")
+        self.assertEqual(self.cache.fetches, 1)
+
+        # Running jobs expire, and are dropped when the queue shows them change
+        self.cache.ttl = 0
+        self.assertEqual(self.cache.get("1234").state, "RUNNING")
+        self.assertEqual(self.cache.fetches, 2)
+        self.cache.ttl = 60
+        self.cache.sync({"1234": "RUNNING"})
+        self.assertEqual(len(self.cache), 1)
+        self.state = "COMPLETED"
+        self.cache.sync({})
+        self.assertEqual(len(self.cache), 0)
+
+        # Finished jobs never expire
+        self.cache.ttl = 0
+        self.assertTrue(self.cache.get("1234").is_finished)
+        self.cache.get("1234")
+        self.cache.sync({})
+        self.assertEqual(self.cache.fetches, 3)
+
+        self.cache.invalidate("1234")
+        self.assertEqual(len(self.cache), 0)
+
+    def test_prefetch(self):
+        one_line = " ".join(line.strip() for line in self.fetch("1234").splitlines())
+        outputs = {"1234": one_line,
+                   "1235": one_line.replace("1234", "1235"),
+                   "1236": "slurm_load_jobs error: Invalid job id specified",
+                   "1237_5": one_line.replace("JobId=1234", "JobId=1240 ArrayJobId=1237 ArrayTaskId=5")}
+        batches = []
+
+        def run_batch(cmds):
+            batches.append(cmds)
+            return [outputs[cmd.split()[-1]] for cmd in cmds]
+
+        self.assertEqual(self.cache.prefetch(run_batch, ["1234", "1235", "1236", "1237_5"]), 3)
+        self.assertEqual(batches, [[f"scontrol -o show job {jobid}" for jobid in ["1234", "1235", "1236", "1237_5"]]])
+        self.assertEqual(self.cache.get("1235").workdir, "/home/ambr/h2o")
+        self.assertTrue(self.cache.get("1234").text.startswith("JobId=1234\n   JobName=h2o opt.job\n"))
+        self.assertEqual(self.cache.get("1237_5").get("JobId"), "1240")
+        self.assertEqual(self.cache.fetches, 1)
+
+        # Jobs the prefetch did not find are not prefetched again while they are in the queue
+        self.assertEqual(self.cache.missing(["1234", "1236", "1237"]), ["1237"])
+
+        # Expired records are prefetched again
+        self.cache.ttl = 0
+        self.assertEqual(self.cache.missing(["1234", "1236"]), ["1234"])
+        self.cache.ttl = 60
+        self.cache.sync({"1234": "RUNNING", "1235": "RUNNING"})
+        self.assertEqual(self.cache.unknown, set())
+
+    def test_sacct_fallback(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "records.sqlite")
+        commands = []
+
+        def run(cmd):
+            commands.append(cmd)
+            return ("1234|1234|COMPLETED|/home/ambr/h2o|/home/ambr/h2o/%x-%j.out|ambr|||h2o\n"
+                    "1235|1235|CANCELLED by 1000|/home/ambr/co|/home/ambr/co/co.out|ambr|||co\n"
+                    "1230_7|1238|COMPLETED|/home/ambr/scan|/home/ambr/scan/%u-%A_%a-%j.out|ambr|1230|7|scan\n")
+
+        try:
+            # scontrol has forgotten the job
+            cache = JobRecordCache(lambda jobid: "slurm_load_jobs error: Invalid job id specified", run=run,
+                                   store=JobRecordStore(path))
+            record = cache.get("1234")
+            self.assertEqual((record.jobname, record.workdir, record.state), ("h2o-1234", "/home/ambr/h2o", "COMPLETED"))
+            self.assertIn("-j 1234 ", commands[0])
+
+            self.assertEqual(cache.fetch_finished(["1234", "1235", "1236", "1230_7"]), 3)
+            self.assertIn("-j 1236 ", commands[1])  # 1235 came with the first call, and was stored
+            self.assertEqual(cache.missing(["1235", "1236"]), [])
+            self.assertEqual(cache.records["1230_7"].jobname, "ambr-1230_7-1238")
+            self.assertNotIn("ArrayTaskId", cache.records["1234"].fields)
+            cache.store.close()
+
+            # Finished jobs are kept across sessions
+            cache = JobRecordCache(self.fetch, store=JobRecordStore(path))
+            self.assertEqual(cache.get("1235").state, "CANCELLED")
+            self.assertEqual(cache.fetches, 0)
+            self.assertEqual(cache.get("1237").state, "RUNNING")
+            cache.store.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_job(self):
+        job = Job(pid="1234", records=self.cache)
+        self.assertEqual(job.get_info("WorkDir"), "/home/ambr/h2o")
+        self.assertEqual(job.get_info("RunTime"), "00:10:00")
+        self.assertEqual(self.cache.fetches, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from scheduler import PollScheduler, TimerRegistry
+from fakes import FakeWidget
+
+
+class TestPollScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.poller = PollScheduler(4000, minimum=1000, max_factor=4)
+
+    def test_backoff(self):
+        self.assertEqual(self.poller.next(focused=True), 4000)
+        self.assertEqual([self.poller.next(focused=False) for _ in range(4)], [8000, 16000, 16000, 16000])
+        self.assertEqual(self.poller.next(focused=True), 4000)
+
+    def test_burst(self):
+        self.assertEqual(self.poller.next(changed=True, focused=False), 1000)
+        self.assertEqual([self.poller.next() for _ in range(3)], [2000, 4000, 4000])
+
+        self.poller.burst()
+        self.assertEqual(self.poller.next(), 1000)
+
+    def test_minimum(self):
+        poller = PollScheduler(500, minimum=1000)
+        self.assertEqual(poller.next(), 1000)
+
+
+class TestTimerRegistry(unittest.TestCase):
+
+    def test_lifecycle(self):
+        widget = FakeWidget()
+        timers = TimerRegistry(widget)
+        calls = []
+
+        def poll():
+            calls.append("poll")
+            timers.after("poll", 100, poll)
+
+        timers.after("poll", 100, poll)
+        timers.after("poll", 100, poll)  # re-arming does not add a duplicate
+        self.assertEqual(len(widget.scheduled), 1)
+        self.assertGreaterEqual(TimerRegistry.live(), 1)
+
+        widget.tick()
+        widget.tick()
+        self.assertEqual(calls, ["poll", "poll"])
+        self.assertIn("poll", timers)
+
+        timers.cancel_all()
+        self.assertEqual(len(timers), 0)
+        self.assertEqual(widget.scheduled, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+from scratchindex import ScratchIndex
+
+
+class TestScratchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.names = ["1234", "h2o.1235", "tmp", "11234"]
+        self.mtime = 100
+        self.index = ScratchIndex("/cluster/work/jobs", lambda path: list(self.names), lambda path: self.mtime)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup("1234"), "1234")
+        self.assertEqual(self.index.lookup("1235"), "h2o.1235")
+        self.assertEqual(self.index.lookup("11234"), "11234")
+        self.assertIsNone(self.index.lookup("234"))
+        self.assertEqual(len(self.index), 3)
+
+        # The root is only listed again when it changes
+        self.assertEqual(self.index.listings, 1)
+        self.names = ["1235", "1236"]
+        self.assertIsNone(self.index.lookup("1236"))
+        self.mtime = 200
+        self.assertEqual(self.index.lookup("1236"), "1236")
+        self.assertIsNone(self.index.lookup("1234"))
+        self.assertEqual(self.index.lookup("1235"), "1235")
+        self.assertEqual(self.index.listings, 2)
+
+    def test_array_tasks(self):
+        self.names = ["scan.1230_7", "scan.1230_8", "run_12_1236"]
+        self.assertEqual(self.index.lookup("1230_7"), "scan.1230_7")
+        self.assertEqual(self.index.lookup("1230_8"), "scan.1230_8")
+        self.assertIsNone(self.index.lookup("1230"))
+        self.assertEqual(self.index.lookup("1236"), "run_12_1236")
+
+        self.names = ["scan.1230_8"]
+        self.mtime = 200
+        self.assertIsNone(self.index.lookup("1230_7"))
+        self.assertEqual(len(self.index), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
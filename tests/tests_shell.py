@@ -0,0 +1,44 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from shell import RemoteShell, ShellError
+from fakes import LocalSession
+
+
+class TestRemoteShell(unittest.TestCase):
+
+    def setUp(self):
+        self.session = LocalSession()
+        self.shell = RemoteShell(self.session, timeout=5)
+
+    def tearDown(self):
+        self.shell.close()
+
+    def test_run(self):
+        result = self.shell.run("echo 'hello wörld'; echo oops >&2; exit 4")
+        self.assertEqual(result, ("hello wörld\n", "oops\n", 4))
+
+    def test_pipelined(self):
+        requests = [self.shell.submit(f"printf '%s\\n\\n' {i}") for i in range(20)]
+        self.assertEqual([r.result(5).stdout for r in requests], [f"{i}\n\n" for i in range(20)])
+        self.assertEqual(self.session.started, 1)
+
+    def test_restart(self):
+        self.shell.timeout = 0.5
+        with self.assertRaises(TimeoutError):
+            self.shell.run("sleep 10")
+        self.shell.timeout = 5
+        self.assertEqual(self.shell.run("echo alive").stdout, "alive\n")
+        self.assertEqual(self.session.started, 2)
+
+    def test_crash(self):
+        with self.assertRaises(ShellError):
+            self.shell.run("kill -9 $$")
+        self.assertEqual(self.shell.run("echo alive").stdout, "alive\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
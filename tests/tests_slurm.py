@@ -0,0 +1,144 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+import slurm
+from snapshot import QueueSnapshot
+
+
+SQUEUE_OUTPUT = """\
+1001|normal|RUNNING|ambr|1:02:03|2-00:00:00|2|80|c1-[1-2]|h2o opt
+1002|normal|PENDING|ambr|0:00|1-00:00:00|1|40|(Priority)|name|with|pipes
+garbage line
+"""
+
+
+class TestSqueue(unittest.TestCase):
+
+    def setUp(self):
+        self.jobs = slurm.parse_squeue(SQUEUE_OUTPUT)
+
+    def test_command(self):
+        cmd = slurm.squeue_command("ambr", "r")
+        self.assertIn("-u ambr", cmd)
+        self.assertIn("-t r", cmd)
+        self.assertNotIn("-u", slurm.squeue_command("all", "all"))
+
+    def test_parse(self):
+        self.assertEqual(len(self.jobs), 2)
+        self.assertEqual(self.jobs[0].name, "h2o opt")
+        self.assertEqual(self.jobs[0].cpus, 80)
+        self.assertEqual(self.jobs[1].name, "name|with|pipes")
+        self.assertEqual(self.jobs[1].reason, "(Priority)")
+
+    def test_format(self):
+        header, lines = slurm.format_queue(self.jobs)
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(header.startswith("           NAME JOBID"))
+        self.assertTrue(lines[0].startswith("        h2o opt  1001"))
+        self.assertEqual(len(set(len(line.rsplit(" ", 1)[0]) for line in [header] + lines)), 1)
+
+        header, lines = slurm.format_queue(self.jobs, last_write={"1001": 1000.0}, now=1125.0)
+        self.assertEqual(header.split()[-2:], ["LAST_WRITE", "NODELIST(REASON)"])
+        self.assertIn(" 00:02:05 ", lines[0])
+        self.assertEqual(len(set(len(line.rsplit(" ", 1)[0]) for line in [header] + lines)), 1)
+
+    def test_select(self):
+        self.assertEqual(len(slurm.select_jobs(self.jobs, "all", "all")), 2)
+        self.assertEqual([job.jobid for job in slurm.select_jobs(self.jobs, "ambr", "pd")], ["1002"])
+        self.assertEqual(slurm.select_jobs(self.jobs, "someone"), [])
+        self.assertEqual(slurm.count_states(self.jobs), (1, 1))
+
+    def test_cpu_usage(self):
+        usage = slurm.parse_cpu_usage("ambr|normal|80|40\nambr|bigmem|80|0\nbad line\n")
+        self.assertEqual(usage, [("ambr", "normal", 80, 40), ("ambr", "bigmem", 80, 0)])
+
+        header, rows, total = slurm.format_cpu_usage(usage, 1600)
+        self.assertEqual(header.split(), ["User", "Run", "%", "Pend", "normal", "(R/P)", "bigmem", "(R/P)"])
+        self.assertEqual(rows[0][0], "ambr")
+        self.assertEqual(rows[0][1].split(), ["ambr", "160", "10.00", "40", "80/40", "80/0"])
+        self.assertEqual(total.split(), ["SUM:", "160", "10.00", "40", "80/40", "80/0"])
+
+    def test_state_tag(self):
+        self.assertEqual(slurm.state_tag("RUNNING"), "job_running")
+        self.assertEqual(slurm.state_tag("CANCELLED by 123"), "job_cancelled")
+        self.assertIsNone(slurm.state_tag("SUSPENDED"))
+
+
+class TestQueueSnapshot(unittest.TestCase):
+
+    def test_ttl(self):
+        jobs = slurm.parse_squeue(SQUEUE_OUTPUT)
+        snapshot = QueueSnapshot(lambda user: jobs, ttl=60)
+        self.assertIsNone(snapshot.cached())
+
+        self.assertEqual(len(snapshot.get("ambr", "r")), 1)
+        self.assertEqual(len(snapshot.get()), 2)
+        self.assertEqual(len(snapshot.cached("ambr", "pd")), 1)
+        self.assertEqual(snapshot.fetches, 1)
+
+        snapshot.invalidate()
+        self.assertIsNone(snapshot.cached())
+        snapshot.get()
+        self.assertEqual(snapshot.fetches, 2)
+
+    def test_user(self):
+        jobs = slurm.parse_squeue(SQUEUE_OUTPUT)
+        users = []
+        snapshot = QueueSnapshot(lambda user: users.append(user) or jobs, ttl=60, user="ambr")
+        self.assertEqual(len(snapshot.get("ambr")), 2)
+        self.assertEqual(users, ["ambr"])
+
+        # Anyone else is not in the snapshot
+        self.assertFalse(snapshot.covers("all"))
+        self.assertIsNone(snapshot.cached("all"))
+        self.assertIsNone(snapshot.cached("other"))
+        with self.assertRaises(ValueError):
+            snapshot.get("other")
+
+    def test_apply(self):
+        jobs = slurm.parse_squeue(SQUEUE_OUTPUT)
+        snapshot = QueueSnapshot(lambda user: [], ttl=60)
+        snapshot.apply(jobs, full=True)
+        self.assertFalse(snapshot.changed)
+
+        started = jobs[1]._replace(state="RUNNING")
+        new = jobs[0]._replace(jobid="1003")
+        snapshot.apply([started, new], removed=["1001"])
+        self.assertEqual([(job.jobid, job.state) for job in snapshot.cached()],
+                         [("1002", "RUNNING"), ("1003", "RUNNING")])
+        self.assertTrue(snapshot.changed)
+        self.assertEqual(snapshot.fetches, 0)
+
+        # Elapsed times are no change
+        snapshot.apply([], times={"1002": "0:05"})
+        self.assertEqual(snapshot.cached()[0].time, "0:05")
+        self.assertFalse(snapshot.changed)
+
+    def test_streaming(self):
+        jobs = slurm.parse_squeue(SQUEUE_OUTPUT)
+        snapshot = QueueSnapshot(lambda user: [], ttl=0, user="ambr")
+        snapshot.apply(jobs, full=True)
+        self.assertIsNone(snapshot.cached("ambr"))
+
+        # While streaming, the snapshot stays fresh, and the elapsed times of running jobs advance
+        snapshot.streaming = True
+        snapshot._sampled["1001"] -= 60
+        self.assertEqual([job.time for job in snapshot.cached("ambr")], ["1:03:03", "0:00"])
+        self.assertEqual(snapshot.jobs[0].time, "1:02:03")
+
+    def test_changed(self):
+        jobs = slurm.parse_squeue(SQUEUE_OUTPUT)
+        snapshot = QueueSnapshot(lambda user: [], ttl=60, user="ambr")
+        snapshot.apply(jobs, full=True)
+
+        # Jobs of other users coming and going do not count
+        snapshot.apply([jobs[0]._replace(jobid="1003", user="other")])
+        self.assertFalse(snapshot.changed)
+        snapshot.apply([jobs[1]._replace(state="RUNNING")])
+        self.assertTrue(snapshot.changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
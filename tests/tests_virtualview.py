@@ -0,0 +1,120 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queuegui"))
+
+from virtualview import VirtualView, column_spans
+
+
+class FakeText:
+    """Line based stand-in for tk.Text, as no display is available for the tests"""
+
+    def __init__(self, height):
+        self.height = height
+        self.lines = [""]
+        self.inserted = 0
+
+    def config(self, **kwargs):
+        pass
+
+    def bind(self, *args, **kwargs):
+        pass
+
+    def tag_bind(self, *args, **kwargs):
+        pass
+
+    def winfo_height(self):
+        return 1
+
+    def cget(self, option):
+        return self.height
+
+    def get(self, start, end):
+        return self.lines[0]
+
+    def index(self, index):
+        return f"{len(self.lines)}.0"
+
+    def delete(self, start, end):
+        if end == "end":
+            self.lines = [""]
+        else:
+            del self.lines[int(start.split(".")[0]) - 1:int(end.split(".")[0]) - 1]
+
+    def insert(self, index, *chunks):
+        text = "".join(chunks[0::2])
+        new = text.split("\n")[:-1]
+        self.inserted += len(new)
+        row = int(index.split(".")[0]) - 1
+        self.lines[row:row] = new
+
+
+class FakeScrollbar:
+
+    def config(self, **kwargs):
+        pass
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+class TestVirtualView(unittest.TestCase):
+
+    def setUp(self):
+        self.text = FakeText(height=11)
+        self.scrollbar = FakeScrollbar()
+        self.view = VirtualView(self.text, self.scrollbar)
+        self.header = "   JOBID  CPUS NAME"
+        self.rows = [(str(i), f"{i:8d} {i % 7:5d} job{i}", None) for i in range(100000)]
+
+    def test_window(self):
+        self.view.show(self.header, self.rows)
+        self.assertEqual(self.text.lines[:-1], [self.header] + [line for _, line, _ in self.rows[:10]])
+        self.assertTrue(self.view.is_shown())
+        self.assertEqual(self.scrollbar.position, (0.0, 0.0001))
+
+        # Scrolling one row only touches one row
+        self.text.inserted = 0
+        self.view.yview("scroll", 1, "units")
+        self.assertEqual(self.text.lines[1], self.rows[1][1])
+        self.assertEqual(self.text.inserted, 1)
+
+        self.view.yview("moveto", "1.0")
+        self.assertEqual(self.text.lines[-2], self.rows[-1][1])
+        self.assertEqual(len(self.text.lines), 12)
+
+        # Another view writes to the text box
+        self.text.lines = ["scontrol output", ""]
+        self.assertFalse(self.view.is_shown())
+
+    def test_sort_and_filter(self):
+        self.view.show(self.header, self.rows[:100])
+        self.view.sort(1, reverse=True)
+        self.assertEqual(self.text.lines[1], self.rows[6][1])
+        self.view.sort(0, reverse=True)
+        self.assertEqual(self.text.lines[1], self.rows[99][1])
+
+        # The sort order is kept when the same table is shown again
+        self.view.show(self.header, self.rows[:50])
+        self.assertEqual(self.text.lines[1], self.rows[49][1])
+
+        self.view.filter(lambda line: line.endswith("job7"))
+        self.assertEqual(self.text.lines[:-1], [self.header, self.rows[7][1]])
+
+    def test_on_window(self):
+        windows = []
+        view = VirtualView(self.text, self.scrollbar, on_window=windows.append)
+        view.show(self.header, self.rows)
+        view.refresh()
+        view.yview("scroll", 1, "units")
+        self.assertEqual(len(windows), 2)
+        self.assertEqual(windows[1], self.rows[1:11])
+
+    def test_column_spans(self):
+        self.assertEqual(column_spans(self.header)[:2], [(0, 8), (8, 14)])
+        self.assertEqual(column_spans(self.header)[2][0], 14)
+        self.assertEqual(column_spans(""), [])
+
+
+if __name__ == "__main__":
+    unittest.main()